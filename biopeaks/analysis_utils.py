@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
-import pandas as pd
 from scipy.interpolate import interp1d
 
 
 def compute_threshold(signal, alpha, window_width):
+    import pandas as pd
 
     df = pd.DataFrame({'signal': np.abs(signal)})
     q1 = df.rolling(window_width, center=True,
@@ -32,20 +32,102 @@ def update_indices(source_idcs, update_idcs, update):
     return update_idcs
 
 
-def interp_stats(peaks, stats, nsamp):
+def interp_stats(peaks, stats, nsamp, dtype=np.float64):
     """
     interpolate descriptive statistics over the entire duration of the
     signal: samples up until first peak and from last peak to end of signal
     are set to the value of the first and last element of stats respectively;
     linear (2nd order) interpolation is chosen since cubic (4th order)
     interpolation can lead to biologically implausible interpolated values
-    and erratic fluctuations due to overfitting
+    and erratic fluctuations due to overfitting; the interpolation is
+    computed in double precision and the result is returned as dtype
     """
     f = interp1d(np.ravel(peaks), stats, kind='slinear',
                  bounds_error=False, fill_value=([stats[0]], [stats[-1]]))
     # internally, for consistency in plotting etc., keep original sampling
     # rate
     samples = np.arange(0, nsamp)
-    statsintp = f(samples)
+    statsintp = f(samples).astype(dtype, copy=False)
 
     return statsintp
+
+
+def signal_quality(signal, sfreq, windowlength=2, maxflatduration=.5,
+                   maxclipped=.1, minkurtosis=None, band=None,
+                   minpowerratio=.5):
+    """Mark the parts of the signal that are unusable for peak detection (e.g.,
+    flat line, clipping, electrode off).
+
+    The signal is divided into consecutive windows (the last window consists
+    of the last windowlength seconds of the signal). A window is unusable if
+    any of the following signal quality indices fails:
+
+    - flat line: the longest run of identical samples lasts longer than
+      maxflatduration seconds. Unlike the fraction of repeated samples, the
+      duration does not depend on the sampling rate or the resolution of the
+      analog-to-digital converter.
+    - saturation: the fraction of samples at the minimum or maximum of the
+      entire signal (i.e., the range of the amplifier) exceeds maxclipped.
+    - kurtosis: the kurtosis is below minkurtosis (e.g., 5 for ECG, whose
+      sharp QRS complexes result in a peaked distribution). Ignored if
+      minkurtosis is None (default).
+    - spectral power ratio: the fraction of the power (mean removed) in band
+      (low, high) in Hertz is below minpowerratio (e.g., (5, 15) for the QRS
+      complexes of the ECG). Ignored if band is None (default).
+
+    Returns
+    -------
+    usable : ndarray of bool
+        Same size as signal, False for the samples in unusable windows.
+    """
+    n_samples = signal.size
+    if not n_samples:
+        return np.zeros(0, dtype=bool)
+    size = min(max(int(np.rint(windowlength * sfreq)), 2), n_samples)
+    n_windows = n_samples // size
+    windows = signal[:n_windows * size].reshape(n_windows, size)
+    remainder = n_samples - n_windows * size
+    if remainder:
+        windows = np.vstack((windows, signal[-size:]))
+    windows = windows.astype(np.float64)
+
+    flat = _longest_constant_run(windows) / sfreq
+    clipped = np.mean(np.logical_or(windows >= np.max(signal),
+                                    windows <= np.min(signal)), axis=1)
+    usable = np.logical_and(flat <= maxflatduration, clipped <= maxclipped)
+
+    centered = windows - windows.mean(axis=1, keepdims=True)
+
+    if minkurtosis is not None:
+        # Flat windows have undefined kurtosis and count as unusable.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            kurtosis = (np.mean(centered ** 4, axis=1) /
+                        np.mean(centered ** 2, axis=1) ** 2)
+        usable &= kurtosis >= minkurtosis
+
+    if band is not None:
+        power = np.abs(np.fft.rfft(centered, axis=1)) ** 2
+        freqs = np.fft.rfftfreq(size, 1 / sfreq)
+        inband = np.logical_and(freqs >= band[0], freqs <= band[1])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = power[:, inband].sum(axis=1) / power.sum(axis=1)
+        usable &= ratio >= minpowerratio
+
+    return np.concatenate((np.repeat(usable[:n_windows], size),
+                           np.repeat(usable[n_windows:], remainder)))
+
+
+def _longest_constant_run(windows):
+    """Number of samples in the longest run of identical samples in each row
+    of windows."""
+    n_windows, size = windows.shape
+    # Mark the samples that equal their predecessor. The first and last
+    # column are False, such that runs don't extend across rows.
+    repeated = np.zeros((n_windows, size + 1), dtype=np.int8)
+    repeated[:, 1:size] = windows[:, 1:] == windows[:, :-1]
+    edges = np.flatnonzero(np.diff(repeated.ravel()))
+    begs, ends = edges[::2], edges[1::2]
+    longest = np.ones(n_windows, dtype=int)
+    np.maximum.at(longest, begs // (size + 1), ends - begs + 1)
+
+    return longest
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Time the functions in `biopeaks.filters` over a grid of signal durations,
+sampling rates, and dtypes.
+
+Run from the benchmarks folder, e.g.:
+
+    python benchmark_filters.py --output filters.json
+    python benchmark_filters.py --output filters_new.json --baseline filters.json
+
+With --baseline, every measurement is compared to the matching measurement in
+the baseline file and the script exits with status 1 if any function got
+slower by more than the given factor.
+"""
+
+import argparse
+import json
+import platform
+import sys
+from timeit import default_timer as timer
+import numpy as np
+from biopeaks import filters
+
+
+durations = {"1min": 60, "10min": 600, "1h": 3600, "24h": 86400}
+sfreqs = [100, 250, 500, 1000, 2000]
+dtypes = ["float64", "float32", "int16"]
+
+
+def _push_chunks(stream, signal, sfreq):
+    """Push the signal in chunks of one second."""
+    chunksize = int(sfreq)
+    for beg in range(0, signal.size, chunksize):
+        stream.push(signal[beg:beg + chunksize])
+
+
+filterfuncs = {
+    "butter_lowpass_filter":
+        lambda x, sfreq: filters.butter_lowpass_filter(x, 10, sfreq),
+    "butter_highpass_filter":
+        lambda x, sfreq: filters.butter_highpass_filter(x, .5, sfreq),
+    "butter_bandpass_filter":
+        lambda x, sfreq: filters.butter_bandpass_filter(x, .5, 8, sfreq,
+                                                        order=3),
+    "butter_highpass_filter_fft":
+        lambda x, sfreq: filters.filterbank.filtfilt(x, "high", .5, sfreq,
+                                                     engine="fft"),
+    "butter_highpass_filter_chunked":
+        lambda x, sfreq: filters.filterbank.filtfilt_chunked(x, "high", .5,
+                                                             sfreq),
+    "moving_average":
+        lambda x, sfreq: filters.moving_average(x, int(np.rint(.75 * sfreq))),
+    "moving_averages":
+        lambda x, sfreq: filters.moving_averages(x, [int(np.rint(.111 * sfreq)),
+                                                     int(np.rint(.667 * sfreq))]),
+    "powerline_filter":
+        lambda x, sfreq: filters.powerline_filter(x, sfreq),
+    "powerline_filter_notch":
+        lambda x, sfreq: filters.powerline_filter(x, sfreq, freq=50),
+    "detect_powerline":
+        lambda x, sfreq: filters.detect_powerline(x, sfreq),
+    "HighpassStream":
+        lambda x, sfreq: _push_chunks(filters.HighpassStream(.5, sfreq), x,
+                                      sfreq),
+    "BandpassStream":
+        lambda x, sfreq: _push_chunks(filters.BandpassStream(.5, 8, sfreq,
+                                                             order=3), x,
+                                      sfreq),
+    "MovingAverageStream":
+        lambda x, sfreq: _push_chunks(filters.MovingAverageStream(int(sfreq)),
+                                      x, sfreq),
+    "PowerlineStream":
+        lambda x, sfreq: _push_chunks(filters.PowerlineStream(sfreq), x,
+                                      sfreq),
+}
+
+
+def simulate_signal(n_samples, sfreq, dtype, rng):
+    """A 1.2 Hz oscillation with 50 Hz noise, baseline drift, and white
+    noise, scaled to the range of 16 bit integers."""
+    sec = np.arange(n_samples) / sfreq
+    signal = (np.sin(2 * np.pi * 1.2 * sec) + .2 * np.sin(2 * np.pi * 50 * sec)
+              + .5 * np.sin(2 * np.pi * .01 * sec)
+              + rng.normal(0, .1, n_samples))
+    signal *= 10000
+
+    return signal.astype(dtype)
+
+
+def time_function(func, signal, sfreq, n_runs):
+    """Time func over n_runs.
+
+    Returns
+    -------
+    timing : dict
+        Median and interquartile range of the run times in seconds.
+    """
+    times = []
+    for _ in range(n_runs):
+        start = timer()
+        func(signal, sfreq)
+        times.append(timer() - start)
+    q1, median, q3 = np.percentile(times, [25, 50, 75])
+
+    return {"median": median, "iqr": q3 - q1}
+
+
+def run_benchmarks(durations, sfreqs, dtypes, funcnames, n_runs=5,
+                   max_samples=np.inf):
+    """Time each function on each combination of duration, sampling rate, and
+    dtype. Combinations with more than max_samples samples are skipped."""
+    rng = np.random.default_rng(42)
+    results = []
+
+    for durationname, duration in durations.items():
+        for sfreq in sfreqs:
+
+            n_samples = int(duration * sfreq)
+            if n_samples > max_samples:
+                print(f"Skipping {durationname} at {sfreq} Hz "
+                      f"({n_samples} samples).")
+                continue
+
+            for dtype in dtypes:
+
+                signal = simulate_signal(n_samples, sfreq, dtype, rng)
+
+                for funcname in funcnames:
+                    timing = time_function(filterfuncs[funcname], signal,
+                                           sfreq, n_runs)
+                    result = {"function": funcname, "duration": durationname,
+                              "sfreq": sfreq, "dtype": dtype,
+                              "n_samples": n_samples, **timing}
+                    results.append(result)
+                    print(f"{funcname:<32}{durationname:>6}{sfreq:>6} Hz "
+                          f"{dtype:>8}: median = {timing['median']:.4f} s, "
+                          f"IQR = {timing['iqr']:.4f} s")
+
+    return results
+
+
+def compare_baseline(results, baseline, tolerance=1.25):
+    """Find measurements whose median run time exceeds the median run time of
+    the matching baseline measurement by more than a factor of tolerance.
+
+    Returns
+    -------
+    regressions : list of dict
+        The regressions, including the baseline median and the ratio.
+    """
+    def key(result):
+        return (result["function"], result["duration"], result["sfreq"],
+                result["dtype"])
+
+    baseline = {key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        reference = baseline.get(key(result))
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        if ratio > tolerance:
+            regressions.append({**result,
+                                "baseline_median": reference["median"],
+                                "ratio": ratio})
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_filters.json",
+                        help="Path of the JSON file receiving the results.")
+    parser.add_argument("--baseline", default=None,
+                        help="Path of a JSON file with baseline results.")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="Maximum permitted ratio of median run time to "
+                             "baseline median run time.")
+    parser.add_argument("--n-runs", type=int, default=5)
+    parser.add_argument("--max-samples", type=float, default=np.inf,
+                        help="Skip signals with more samples.")
+    parser.add_argument("--durations", nargs="+", default=list(durations),
+                        choices=list(durations))
+    parser.add_argument("--sfreqs", nargs="+", type=int, default=sfreqs)
+    parser.add_argument("--dtypes", nargs="+", default=dtypes,
+                        choices=dtypes)
+    parser.add_argument("--functions", nargs="+", default=list(filterfuncs),
+                        choices=list(filterfuncs))
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks({d: durations[d] for d in args.durations},
+                             args.sfreqs, args.dtypes, args.functions,
+                             n_runs=args.n_runs, max_samples=args.max_samples)
+
+    output = {"python": platform.python_version(),
+              "numpy": np.__version__,
+              "machine": platform.machine(),
+              "processor": platform.processor(),
+              "n_runs": args.n_runs,
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nWrote results to {args.output}.")
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare_baseline(results, baseline, args.tolerance)
+
+    if not regressions:
+        print(f"No slowdowns compared to {args.baseline}.")
+        return 0
+
+    print(f"\n{len(regressions)} slowdowns compared to {args.baseline}:")
+    for r in regressions:
+        print(f"{r['function']:<32}{r['duration']:>6}{r['sfreq']:>6} Hz "
+              f"{r['dtype']:>8}: {r['median']:.4f} s vs. "
+              f"{r['baseline_median']:.4f} s ({r['ratio']:.2f}x)")
+
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
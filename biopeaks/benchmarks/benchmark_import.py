@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Time the import of the headless core modules of biopeaks, each in a fresh
+interpreter, and check that none of them loads a GUI or plotting library.
+
+Run from the benchmarks folder, e.g.:
+
+    python benchmark_import.py --output import.json
+    python benchmark_import.py --budget 1.5
+
+The script exits with status 1 if the median import time of any module
+exceeds the budget (in seconds), or if any module loads one of the
+forbidden packages.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import numpy as np
+
+
+coremodules = ["biopeaks.filters", "biopeaks.heart", "biopeaks.resp",
+               "biopeaks.io_utils", "biopeaks.analysis_utils",
+               "biopeaks.multichannel"]
+forbidden = ["matplotlib", "pandas", "PySide2"]
+
+_probe = """
+import sys
+from timeit import default_timer as timer
+start = timer()
+import {module}
+duration = timer() - start
+loaded = sorted({{name.split(".")[0] for name in sys.modules}} & set({forbidden}))
+print(duration, *loaded)
+"""
+
+
+def time_import(module, n_runs):
+    """Import module n_runs times, each time in a new interpreter.
+
+    Returns
+    -------
+    timing : dict
+        Median and interquartile range of the import times in seconds, and
+        the forbidden packages loaded by the import.
+    """
+    times = []
+    for _ in range(n_runs):
+        result = subprocess.run([sys.executable, "-c",
+                                 _probe.format(module=module,
+                                               forbidden=forbidden)],
+                                capture_output=True, text=True, check=True)
+        duration, *loaded = result.stdout.split()
+        times.append(float(duration))
+    q1, median, q3 = np.percentile(times, [25, 50, 75])
+
+    return {"median": median, "iqr": q3 - q1, "loaded": loaded}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_import.json",
+                        help="Path of the JSON file receiving the results.")
+    parser.add_argument("--budget", type=float, default=1.5,
+                        help="Maximum permitted median import time in "
+                             "seconds.")
+    parser.add_argument("--n-runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=coremodules,
+                        choices=coremodules)
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        timing = time_import(module, args.n_runs)
+        results.append({"module": module, **timing})
+        print(f"{module:<28}: median = {timing['median']:.4f} s, "
+              f"IQR = {timing['iqr']:.4f} s, "
+              f"loaded = {', '.join(timing['loaded']) or '-'}")
+
+    output = {"python": platform.python_version(),
+              "numpy": np.__version__,
+              "machine": platform.machine(),
+              "processor": platform.processor(),
+              "n_runs": args.n_runs,
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nWrote results to {args.output}.")
+
+    violations = [r for r in results
+                  if r["median"] > args.budget or r["loaded"]]
+    if not violations:
+        print(f"All modules imported within {args.budget} s.")
+        return 0
+
+    print(f"\n{len(violations)} modules exceed the budget of {args.budget} s "
+          f"or load {', '.join(forbidden)}:")
+    for r in violations:
+        print(f"{r['module']:<28}: {r['median']:.4f} s, "
+              f"loaded = {', '.join(r['loaded']) or '-'}")
+
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
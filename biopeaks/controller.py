@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import threading
+from collections import deque
 from functools import wraps
-from .heart import ecg_peaks, ppg_peaks, correct_peaks, heart_period
+from .heart import (ecg_peaks, ppg_peaks, correct_peaks, heart_period,
+                    EcgTuner, PpgTuner)
 from .resp import resp_extrema, resp_stats
+from .analysis_utils import signal_quality
+from .filters import float_dtype
 from .io_utils import (read_custom, read_opensignals, read_edf,
                        write_custom, write_opensignals, write_edf)
 from pathlib import Path
@@ -20,6 +25,9 @@ peakfuncs = {"ECG": ecg_peaks,
              "PPG": ppg_peaks,
              "RESP": resp_extrema}
 
+tuners = {"ECG": EcgTuner,
+          "PPG": PpgTuner}
+
 readfuncs = {"Custom": read_custom,
              "OpenSignals": read_opensignals,
              "EDF": read_edf}
@@ -69,6 +77,12 @@ class Controller(QObject):
         self._model = model
         self.threadpool = QThreadPool()
         self.threadpool.setMaxThreadCount(1)
+        # Serializes the detector tuning on the GUI thread (tune_peaks) and
+        # the worker thread (prepare_tuning, apply_tuning).
+        self._tuninglock = threading.Lock()
+        # The visible range of the most recent parameter change that hasn't
+        # been applied yet (see _apply_pending).
+        self._pendingtuning = deque(maxlen=1)
 
 
     def get_fpaths(self):
@@ -277,8 +291,11 @@ class Controller(QObject):
         # behaves unexpectadly (since plotting is triggered as soon as
         # signal changes).
         self._model.sfreq = biosignal["sfreq"]    # in case of custom file, sfreq is now taken over from customheader
-        self._model.sec = biosignal["sec"]
-        self._model.signal = biosignal["signal"]
+        self._model.sec = biosignal["sec"]    # seconds remain double precision, since single precision cannot resolve samples of long recordings
+        signal = biosignal["signal"]
+        if self._model.dtype is not None:
+            signal = signal.astype(self._model.dtype, copy=False)
+        self._model.signal = signal
         self._model.loaded = True
         self._model.rpathsignal = path
 
@@ -294,7 +311,10 @@ class Controller(QObject):
             self._model.status = marker["error"]
             return
 
-        self._model.sfreqmarker = marker["sfreq"]    # only not set to None in case of EDF
+        # Only EDF files can have a marker channel with a different sampling
+        # rate than the signal channel.
+        self._model.sfreqmarker = (marker["sfreq"] if marker["sfreq"]
+                                   else self._model.sfreq)
         self._model.marker = marker["signal"]
 
 
@@ -323,16 +343,12 @@ class Controller(QObject):
             self._model.tidalampintp = self._model.tidalampintp[begsamp:
                                                                 endsamp]
 
-        # Since the marker channel might be sampled at a different rate in EDF
-        # data, treat it separately.
+        # The marker channel might be sampled at a different rate than the
+        # signal channel.
         if self._model.marker is None:
             return
-        if self._model.filetype == "EDF":
-            sfreq = self._model.sfreqmarker
-        else:
-            sfreq = self._model.sfreq
-        begsamp = int(np.rint(self._model.segment[0] * sfreq))
-        endsamp = int(np.rint(self._model.segment[1] * sfreq))
+        begsamp = int(np.rint(self._model.segment[0] * self._model.sfreqmarker))
+        endsamp = int(np.rint(self._model.segment[1] * self._model.sfreqmarker))
         self._model.marker = self._model.marker[begsamp:endsamp]
         if endsamp - begsamp <= 1:
             self._model.status = "Error: There are not enough samples in the" \
@@ -396,8 +412,107 @@ class Controller(QObject):
             self._model.status = "Error: peaks already in memory."
             return
         peakfunc = peakfuncs[self._model.modality]
+        params = self._model.detectorparams.get(self._model.modality, {})
         self._model.peaks = peakfunc(self._model.signal,
-                                     self._model.sfreq)
+                                     self._model.sfreq, **params)
+
+
+    def tune_peaks(self, xlim=None):
+        """Re-detect the peaks with the current detector parameters, replacing
+        the peaks in memory (including edits). If xlim (seconds) is given,
+        only the peaks within xlim are re-detected (fast enough to update the
+        visible part of the signal while the parameters are adjusted).
+
+        Runs on the GUI thread. The intermediate stages of the detector are
+        computed once per signal on the worker thread (see prepare_tuning).
+        While the worker thread tunes the detector, parameter changes are
+        stored, and the worker thread re-detects the peaks with the most
+        recent parameters once it is done.
+        """
+        if not self._tunable():
+            return
+        self._pendingtuning.append(xlim)
+        if self._tuner() is None:
+            self.prepare_tuning()
+            return
+        self._apply_pending()
+        if self._pendingtuning:
+            self._model.status = "Busy re-detecting peaks."
+
+
+    @threaded
+    def prepare_tuning(self):
+        self._model.status = "Preparing detector tuning."
+        self._apply_pending(blocking=True)
+
+
+    @threaded
+    def apply_tuning(self):
+        if not self._tunable():
+            return
+        self._model.status = "Re-detecting peaks in the entire signal."
+        with self._tuninglock:
+            self._tune()
+        self._apply_pending()
+
+
+    def _apply_pending(self, blocking=False):
+        """Apply the most recent pending parameter change unless another
+        thread holds the tuning lock. Every thread calls this after releasing
+        the lock, such that a change that arrived in the meantime is applied
+        by whichever thread is done last."""
+        while (self._pendingtuning and
+               self._tuninglock.acquire(blocking=blocking)):
+            try:
+                # Only the thread holding the lock removes pending changes.
+                if self._pendingtuning:
+                    self._tune(self._pendingtuning.popleft())
+            finally:
+                self._tuninglock.release()
+
+
+    def _tunable(self):
+        if not self._model.loaded:
+            self._model.status = "Error: no data available."
+            return False
+        if self._model.modality not in tuners:
+            self._model.status = "Only ECG or PPG detectors can be tuned."
+            return False
+        return True
+
+
+    def _tuner(self):
+        """The tuner of the current signal and modality, or None if it hasn't
+        been computed yet. Intermediate stages are cached per signal (e.g.,
+        until a segment is selected)."""
+        tuner = self._model.tuner
+        if (isinstance(tuner, tuners[self._model.modality]) and
+                tuner.signal is self._model.signal):
+            return tuner
+        return None
+
+
+    def _tune(self, xlim=None):
+        """Must be called while holding the tuning lock."""
+        modality = self._model.modality
+        tuner = self._tuner()
+        if tuner is None:
+            tuner = tuners[modality](self._model.signal, self._model.sfreq)
+            self._model.tuner = tuner
+        params = self._model.detectorparams[modality]
+
+        if xlim is None:
+            self._model.peaks = tuner.peaks(**params)
+            return
+        window = np.rint(np.asarray(xlim) * self._model.sfreq).astype(int)
+        window = np.clip(window, 0, self._model.signal.size)
+        peaks = tuner.peaks(window=window, **params)
+        # Retain the peaks outside of xlim.
+        if self._model.peaks is not None:
+            outside = np.logical_or(self._model.peaks < window[0],
+                                    self._model.peaks >= window[1])
+            peaks = np.union1d(self._model.peaks[outside], peaks)
+        self._model.peaks = peaks
 
 
     @threaded
@@ -506,7 +621,8 @@ class Controller(QObject):
             (self._model.periodintp,
              self._model.rateintp) = heart_period(peaks=self._model.peaks,
                                                   sfreq=self._model.sfreq,
-                                                  nsamp=self._model.signal.size)
+                                                  nsamp=self._model.signal.size,
+                                                  dtype=float_dtype(self._model.signal))
         elif self._model.modality == 'RESP':
             (self._model.periodintp,
              self._model.rateintp,
@@ -526,6 +642,13 @@ class Controller(QObject):
                 savearray[:, i] = self._model.rateintp
             if key == 'tidalamp':
                 savearray[:, i] = self._model.tidalampintp
-        savearray = pd.DataFrame(savearray)
-        savearray.to_csv(self._model.wpathstats, index=False, header=savekeys,
+            if key == 'usable':
+                # 1 for samples that are usable for peak detection, 0 for
+                # samples in unusable windows (flat line, clipping).
+                savearray[:, i] = signal_quality(self._model.signal,
+                                                 self._model.sfreq)
+        savearray = pd.DataFrame(savearray, columns=savekeys)
+        if "usable" in savekeys:
+            savearray["usable"] = savearray["usable"].astype(int)
+        savearray.to_csv(self._model.wpathstats, index=False,
                          float_format="%.4f")
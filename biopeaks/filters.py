@@ -1,12 +1,350 @@
 # -*- coding: utf-8 -*-
 
-from scipy.signal import butter, filtfilt
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from scipy.signal import (butter, filtfilt, sosfilt, sosfilt_zi, sosfiltfilt,
+                          fftconvolve, iirnotch, tf2sos, welch, firwin,
+                          resample_poly)
 import numpy as np
+from scipy.fft import rfft, irfft
 
 # use filtfilt to obtain a zero-phase filter, i.e. the filtered signal is not
 # phase shifted with respect to the original signal since the filtering is
 # performed in both directions (phase shifts cancel each other out)
 
+# dtype policy: all filters return single precision output for single
+# precision input and double precision output for any other input (e.g.,
+# int16 EDF samples). Internally, IIR filter states and cumulative sums are
+# always computed in double precision, since single precision is not
+# sufficient for low cutoffs (relative to the sampling rate) and long signals
+# respectively.
+
+
+def float_dtype(data):
+    """The floating point dtype of results derived from data (see dtype
+    policy)."""
+    dtype = np.dtype(getattr(data, "dtype", np.float64))
+    return dtype if dtype == np.float32 else np.dtype(np.float64)
+
+
+class FilterBank:
+    """Design filters once as second-order sections (SOS) and re-use them.
+
+    Designs are cached by filter type, cutoff(s), sampling rate and order.
+    Once the cache holds `maxsize` designs, the least recently used design is
+    discarded. SOS are numerically more robust than the transfer-function
+    (b, a) representation for low cutoffs relative to the sampling rate
+    (e.g., a .05 Hz lowcut at 1000 Hz).
+
+    Zero-phase filtering of long signals (more than `fft_threshold` samples)
+    can be done in the frequency domain: the signal is convolved with the
+    (truncated) zero-phase impulse response of the filter, whose spectrum is
+    the squared magnitude response of the filter, using overlap-save blocks.
+    The truncation is chosen such that the discarded tail of the impulse
+    response holds less than `tolerance` of its energy.
+
+    Signals that don't fit into memory (e.g., np.memmap) can be filtered
+    block by block with `filtfilt_chunked`.
+
+    A bank can be shared by threads (e.g., the module-level `filterbank` in
+    ecg_peaks_parallel): access to the cache is serialized by a lock.
+    """
+
+    def __init__(self, maxsize=64, fft_threshold=None, tolerance=1e-12,
+                 fft_workers=-1):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of filter designs kept in the cache, by default 64.
+        fft_threshold : int, optional
+            Minimum number of samples for which the frequency domain engine
+            is chosen automatically, by default None (never). Whether the
+            frequency domain engine is faster than sosfiltfilt depends on the
+            number of available cores (see `fft_workers`) and the filter.
+        tolerance : float, optional
+            Fraction of the energy of the impulse response that can be
+            discarded by truncation, by default 1e-12. Determines the kernel
+            length of the frequency domain engine and the overlap of blocks
+            in `filtfilt_chunked`.
+        fft_workers : int, optional
+            Number of threads used for the FFTs, by default -1 (all cores).
+        """
+        self.maxsize = maxsize
+        self.fft_threshold = fft_threshold
+        self.tolerance = tolerance
+        self.fft_workers = fft_workers
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sos(self, btype, cutoff, fs, order=5):
+        """
+        Parameters
+        ----------
+        btype : str
+            One of {"low", "high", "band"}.
+        cutoff : float or sequence of float
+            Cutoff frequency in Hertz. For bandpass filters a sequence of
+            lowcut and highcut.
+        fs : float
+            Sampling rate in Hertz.
+        order : int, optional
+            Order of the Butterworth filter, by default 5.
+
+        Returns
+        -------
+        sos : ndarray
+            Second-order sections of shape (n_sections, 6).
+        """
+        key = (btype, tuple(np.ravel(cutoff).tolist()), float(fs), int(order))
+        return self._cached(key, lambda: self._design(*key))
+
+    def filtfilt(self, data, btype, cutoff, fs, order=5, axis=-1,
+                 engine="auto"):
+        """Zero-phase filtering of data along axis with a cached filter
+        design.
+
+        Parameters
+        ----------
+        engine : str, optional
+            One of {"auto", "filtfilt", "fft"}. With "auto" (default), the
+            frequency domain engine is used for signals longer than
+            `fft_threshold` samples.
+        """
+        sos = self.sos(btype, cutoff, fs, order)
+        if engine == "auto":
+            engine = ("fft" if self.fft_threshold is not None and
+                      np.shape(data)[axis] > self.fft_threshold
+                      else "filtfilt")
+        if engine == "filtfilt":
+            filt = sosfiltfilt(sos, data, axis=axis)
+        elif engine == "fft":
+            key = ("fft", btype, tuple(np.ravel(cutoff).tolist()), float(fs),
+                   int(order))
+            kernel_fft, nfft, halflen = self._cached(key,
+                                                     lambda: self._fft_kernel(sos))
+            filt = _overlap_save(data, kernel_fft, nfft, halflen, axis,
+                                 self.fft_workers)
+        else:
+            raise ValueError(f"Unknown filter engine {engine}.")
+
+        return filt.astype(float_dtype(data), copy=False)
+
+    def filtfilt_chunked(self, data, btype, cutoff, fs, order=5, out=None,
+                         blocksize=2 ** 20, axis=-1):
+        """Zero-phase filtering of data along axis, block by block.
+
+        Only one block (plus padding) of data is held in memory at any time,
+        hence data and out can be memory-mapped (np.memmap). Each block is
+        padded with the neighboring samples of the signal on both sides. The
+        padding is as long as the (truncated) impulse response of the filter,
+        such that transients at the block edges have decayed (see
+        `tolerance`) before reaching the samples of the block.
+
+        Parameters
+        ----------
+        data : ndarray or np.memmap
+            The signal.
+        out : ndarray or np.memmap, optional
+            Array of the same shape as data that receives the filtered signal.
+            If None (default), a new array is allocated in memory.
+        blocksize : int, optional
+            Number of samples per block, by default 2 ** 20.
+
+        Returns
+        -------
+        out : ndarray or np.memmap
+            The filtered signal.
+        """
+        sos = self.sos(btype, cutoff, fs, order)
+        key = ("impulse", btype, tuple(np.ravel(cutoff).tolist()), float(fs),
+               int(order))
+        padlen = self._cached(key,
+                              lambda: _impulse_response(sos,
+                                                        self.tolerance).size)
+
+        if out is None:
+            out = np.empty(np.shape(data), dtype=float_dtype(data))
+        data = np.moveaxis(data, axis, -1)
+        outview = np.moveaxis(out, axis, -1)
+        n = data.shape[-1]
+
+        for beg in range(0, n, blocksize):
+            end = min(beg + blocksize, n)
+            padbeg = max(beg - padlen, 0)
+            padend = min(end + padlen, n)
+            block = np.asarray(data[..., padbeg:padend], dtype=float)
+            filt = sosfiltfilt(sos, block, axis=-1)
+            outview[..., beg:end] = filt[..., beg - padbeg:end - padbeg]
+
+        if isinstance(out, np.memmap):
+            out.flush()
+
+        return out
+
+    def notch(self, freq, fs, n_harmonics=None, quality=30):
+        """
+        Parameters
+        ----------
+        freq : float
+            Fundamental frequency of the notch comb in Hertz (e.g., 50 or 60
+            Hz power-line frequency).
+        fs : float
+            Sampling rate in Hertz.
+        n_harmonics : int, optional
+            Number of notches, including the fundamental. By default None,
+            i.e., all harmonics below the Nyquist frequency.
+        quality : float, optional
+            Quality factor of the notch at the fundamental, by default 30.
+            All notches have the same bandwidth (freq / quality).
+
+        Returns
+        -------
+        sos : ndarray or None
+            Second-order sections of shape (n_notches, 6). None if freq is
+            not below the Nyquist frequency.
+        """
+        key = ("notch", float(freq), float(fs), n_harmonics, float(quality))
+        return self._cached(key, lambda: self._design_notch(*key[1:]))
+
+    def resample(self, data, sfreq, target_sfreq, axis=-1):
+        """Resample data along axis from sfreq to target_sfreq with a
+        polyphase filter (scipy.signal.resample_poly). The anti-aliasing
+        filter is designed once per ratio of sampling rates.
+
+        Returns
+        -------
+        resampled : ndarray
+            The resampled data. data itself if the sampling rates are equal.
+        """
+        ratio = (Fraction(target_sfreq).limit_denominator(1000) /
+                 Fraction(sfreq).limit_denominator(1000))
+        up, down = ratio.numerator, ratio.denominator
+        if up == down:
+            return data
+        key = ("resample", up, down)
+        # Same anti-aliasing filter as the default of resample_poly.
+        window = self._cached(key,
+                              lambda: firwin(2 * 10 * max(up, down) + 1,
+                                             1 / max(up, down),
+                                             window=("kaiser", 5.0)))
+        resampled = resample_poly(data, up, down, axis=axis, window=window)
+
+        return resampled.astype(float_dtype(data), copy=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _cached(self, key, design):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is not None:
+                self._cache.move_to_end(key)
+                return item
+        # Design outside of the lock, such that other threads aren't blocked.
+        # If another thread cached the same design in the meantime, re-use
+        # that one.
+        item = design()
+        with self._lock:
+            item = self._cache.setdefault(key, item)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)    # discard least recently used design
+
+        return item
+
+    def _design(self, btype, cutoff, fs, order):
+        nyq = 0.5 * fs
+        normal_cutoff = np.asarray(cutoff) / nyq
+        if normal_cutoff.size == 1:
+            normal_cutoff = normal_cutoff[0]
+        return butter(order, normal_cutoff, btype=btype, output="sos")
+
+    def _design_notch(self, freq, fs, n_harmonics, quality):
+        harmonics = np.arange(1, int(np.ceil(.5 * fs / freq)))
+        harmonics = harmonics[harmonics * freq < .5 * fs]
+        if n_harmonics is not None:
+            harmonics = harmonics[:n_harmonics]
+        if not harmonics.size:
+            return None
+        # Keep the bandwidth of the notches constant across harmonics.
+        sos = [tf2sos(*iirnotch(h * freq, h * quality, fs=fs))
+               for h in harmonics]
+        return np.vstack(sos)
+
+    def _fft_kernel(self, sos):
+        h = _impulse_response(sos, self.tolerance)
+        # The zero-phase impulse response is the autocorrelation of the
+        # impulse response, its center is at index h.size - 1.
+        kernel = fftconvolve(h, h[::-1])
+        # Choose a block length that is large compared to the kernel (i.e.,
+        # little overlap between consecutive blocks).
+        nfft = int(2 ** np.ceil(np.log2(8 * kernel.size)))
+        kernel_fft = rfft(kernel, nfft)
+
+        return kernel_fft, nfft, h.size - 1
+
+
+def _impulse_response(sos, tolerance):
+    """Impulse response of the filter, truncated such that the discarded tail
+    holds less than tolerance of the energy of the impulse response."""
+    # Compute the impulse response over increasingly long intervals until
+    # it has decayed.
+    n = 1024
+    while True:
+        impulse = np.zeros(n)
+        impulse[0] = 1
+        h = sosfilt(sos, impulse)
+        tailenergy = np.cumsum(h[::-1] ** 2)[::-1]    # energy from sample i onwards
+        if tailenergy[n // 2] < tolerance * tailenergy[0]:
+            break
+        n *= 2
+
+    return h[:np.argmax(tailenergy < tolerance * tailenergy[0])]
+
+
+def _overlap_save(data, kernel_fft, nfft, halflen, axis=-1, workers=-1):
+    """Convolve data along axis with a symmetric kernel of length
+    2 * halflen + 1, whose spectrum is kernel_fft, using overlap-save blocks.
+    The signal is extended at both ends by point reflection (see
+    scipy.signal.filtfilt's "odd" padding) to suppress edge transients.
+    """
+    data = np.moveaxis(np.asarray(data, dtype=float), axis, -1)
+    n = data.shape[-1]
+    if n <= halflen:
+        raise ValueError(f"The signal must be longer than {halflen} samples.")
+    # Odd extension at both ends.
+    first = data[..., :1]
+    last = data[..., -1:]
+    padded = np.concatenate((2 * first - data[..., halflen:0:-1], data,
+                             2 * last - data[..., -2:-halflen - 2:-1]),
+                            axis=-1)
+    overlap = 2 * halflen    # kernel length - 1
+    step = nfft - overlap
+    filt = np.empty(data.shape)
+    block = np.zeros(data.shape[:-1] + (nfft,))
+
+    for beg in range(0, n, step):
+        segment = padded[..., beg:beg + nfft]
+        block[..., :segment.shape[-1]] = segment
+        block[..., segment.shape[-1]:] = 0
+        conv = irfft(rfft(block, axis=-1, workers=workers) * kernel_fft, nfft,
+                     axis=-1, workers=workers)
+        # Only samples that don't suffer from circular wrap-around are valid.
+        nvalid = min(step, n - beg)
+        filt[..., beg:beg + nvalid] = conv[..., overlap:overlap + nvalid]
+
+    return np.moveaxis(filt, -1, axis)
+
+
+# Module-level filter bank that is shared by all detectors.
+filterbank = FilterBank()
+
 
 def butter_lowpass(cutoff, fs, order=5):
     nyq = 0.5 * fs
@@ -15,10 +353,9 @@ def butter_lowpass(cutoff, fs, order=5):
     return b, a
 
 
-def butter_lowpass_filter(data, cutoff, fs, order=5):
-    b, a = butter_lowpass(cutoff, fs, order=order)
-    y = filtfilt(b, a, data, method='pad')
-    return y
+def butter_lowpass_filter(data, cutoff, fs, order=5, axis=-1):
+    return filterbank.filtfilt(data, "low", cutoff, fs, order=order,
+                               axis=axis)
 
 
 def butter_highpass(cutoff, fs, order=5):
@@ -28,10 +365,9 @@ def butter_highpass(cutoff, fs, order=5):
     return b, a
 
 
-def butter_highpass_filter(data, cutoff, fs, order=5):
-    b, a = butter_highpass(cutoff, fs, order=order)
-    y = filtfilt(b, a, data, method='pad')
-    return y
+def butter_highpass_filter(data, cutoff, fs, order=5, axis=-1):
+    return filterbank.filtfilt(data, "high", cutoff, fs, order=order,
+                               axis=axis)
 
 
 def butter_bandpass(lowcut, highcut, fs, order=5):
@@ -42,24 +378,283 @@ def butter_bandpass(lowcut, highcut, fs, order=5):
     return b, a
 
 
-def butter_bandpass_filter(data, lowcut, highcut, fs, order=5):
-    b, a = butter_bandpass(lowcut, highcut, fs, order=order)
-    y = filtfilt(b, a, data, method='pad')
-    return y
+def butter_bandpass_filter(data, lowcut, highcut, fs, order=5, axis=-1):
+    return filterbank.filtfilt(data, "band", [lowcut, highcut], fs,
+                               order=order, axis=axis)
+
 
+def moving_average(signal, window_size, out=None, axis=-1):
+    """Moving average with the same alignment as
+    np.convolve(signal, np.ones(window_size) / window_size, mode="same"),
+    computed from a cumulative sum in O(n) regardless of the window size.
 
-def moving_average(signal, window_size):
-    return np.convolve(signal, np.ones((window_size,)) / window_size,
-                       mode='same')
+    Parameters
+    ----------
+    signal : ndarray
+        The signal. Can be multi-dimensional, e.g., of shape
+        (n_channels, n_samples).
+    window_size : int
+        Width of the averaging window in samples.
+    out : ndarray, optional
+        Buffer of the same shape as signal that receives the moving average.
+        Requires window_size to be at most the length of the signal.
+    axis : int, optional
+        The axis along which the moving average is computed, by default -1.
 
+    Returns
+    -------
+    avg : ndarray
+        The moving average (out, if supplied).
+    """
+    out = None if out is None else [out]
+    return moving_averages(signal, [window_size], out=out, axis=axis)[0]
+
+
+def moving_averages(signal, window_sizes, out=None, axis=-1):
+    """Evaluate multiple moving averages of the same signal from a single
+    cumulative sum. See `moving_average`.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The signal.
+    window_sizes : sequence of int
+        Widths of the averaging windows in samples.
+    out : sequence of ndarray, optional
+        One buffer per window size, each of the same shape as signal.
+        Requires all window sizes to be at most the length of the signal.
+    axis : int, optional
+        The axis along which the moving averages are computed, by default -1.
+
+    Returns
+    -------
+    avgs : list of ndarray
+        One moving average per window size.
+    """
+    # Operate on the last axis, all other axes are treated as channels.
+    signal = np.moveaxis(np.asarray(signal), axis, -1)
+    n = signal.shape[-1]
+    csum = np.zeros(signal.shape[:-1] + (n + 1,))
+    np.cumsum(signal, axis=-1, out=csum[..., 1:])
+
+    avgs = []
+    for i, w in enumerate(window_sizes):
+
+        if w > n:
+            if out is not None:
+                raise ValueError(f"The window ({w} samples) is longer than "
+                                 f"the signal ({n} samples), the moving "
+                                 "average doesn't fit into out.")
+            # Convolution in "same" mode returns max(n, w) samples.
+            avg = np.apply_along_axis(np.convolve, -1, signal,
+                                      np.ones((w,)) / w, mode="same")
+            avg = avg.astype(float_dtype(signal), copy=False)
+            avgs.append(np.moveaxis(avg, -1, axis))
+            continue
+
+        avg = (np.empty(signal.shape, dtype=float_dtype(signal))
+               if out is None else np.moveaxis(out[i], axis, -1))
+        # Samples at index i are averaged over the window
+        # [i - w // 2, i + (w - 1) // 2]. Samples outside the signal count as
+        # zero.
+        before = w // 2
+        after = w - before    # one more than the samples after i
+        avg[..., :before] = csum[..., after:w]
+        np.subtract(csum[..., w:], csum[..., :n + 1 - w],
+                    out=avg[..., before:n - after + 1])
+        avg[..., n - after + 1:] = (csum[..., n, None] -
+                                    csum[..., n - w + 1:n - before])
+        avg /= w
+        avgs.append(np.moveaxis(avg, -1, axis) if out is None else out[i])
+
+    return avgs
+
+
+def powerline_filter(data, sfreq, axis=-1, freq=None, n_harmonics=None,
+                     quality=30):
+    """Remove power-line noise.
+
+    By default (freq=None), 50Hz power-line noise is smoothed out with a
+    kernel the width of one period of 50 Hz. Otherwise, a zero-phase notch
+    comb at freq and its harmonics is applied.
+
+    Parameters
+    ----------
+    freq : float or str, optional
+        Power-line frequency in Hertz (usually 50 or 60). If "auto", the
+        power-line frequency is inferred from the spectrum of data (see
+        `detect_powerline`). By default None.
+    n_harmonics : int, optional
+        Number of notches including the fundamental, by default None (all
+        harmonics below the Nyquist frequency).
+    quality : float, optional
+        Quality factor of the notch at the fundamental, by default 30.
+    """
+    if freq == "auto":
+        freq = detect_powerline(data, sfreq, axis=axis)
+    if freq is not None:
+        sos = filterbank.notch(freq, sfreq, n_harmonics, quality)
+        if sos is None:    # power-line frequency isn't below Nyquist frequency
+            return np.array(data, dtype=float_dtype(data))
+        y = sosfiltfilt(sos, data, axis=axis)
+        return y.astype(float_dtype(data), copy=False)
 
-def powerline_filter(data, sfreq):
-    """Smoothing out 50Hz power-line noise with a kernel the width of one
-    period of 50 Hz."""
     if sfreq >= 100:
         b = np.ones(int(sfreq / 50))
     else:
         b = np.ones(2)
     a = [len(b)]
-    y = filtfilt(b, a, data, method="pad")
-    return y
+    y = filtfilt(b, a, data, axis=axis, method="pad")
+    return y.astype(float_dtype(data), copy=False)
+
+
+def align_channel(data, sfreq, target_sfreq, nsamp, axis=-1):
+    """Align a channel sampled at sfreq to a channel with nsamp samples
+    sampled at target_sfreq (e.g., an EDF marker channel to the signal
+    channel). The channel is resampled and subsequently trimmed, or padded
+    with its last value, to nsamp samples (the durations of channels can
+    differ by a fraction of a sample at the target sampling rate).
+    """
+    aligned = np.moveaxis(np.asarray(filterbank.resample(data, sfreq,
+                                                         target_sfreq,
+                                                         axis=axis)),
+                          axis, -1)
+    aligned = aligned[..., :nsamp]
+    if aligned.shape[-1] < nsamp:
+        padwidth = [(0, 0)] * (aligned.ndim - 1) + [(0, nsamp - aligned.shape[-1])]
+        aligned = np.pad(aligned, padwidth, mode="edge")
+
+    return np.moveaxis(aligned, -1, axis)
+
+
+def detect_powerline(data, sfreq, candidates=(50, 60), axis=-1):
+    """Infer the power-line frequency from the spectrum of data.
+
+    Parameters
+    ----------
+    candidates : sequence of float, optional
+        Candidate power-line frequencies in Hertz, by default (50, 60).
+
+    Returns
+    -------
+    freq : float or None
+        The candidate with the most prominent spectral peak relative to the
+        median power within 5 Hz of the candidate. None if none of the
+        candidates is below the Nyquist frequency.
+    """
+    candidates = [f for f in candidates if f < .5 * sfreq]
+    if not candidates:
+        return None
+    data = np.moveaxis(np.asarray(data), axis, -1)
+    nperseg = min(data.shape[-1], int(2 * sfreq))    # .5 Hz resolution
+    freqs, power = welch(data, fs=sfreq, nperseg=nperseg, axis=-1)
+    power = power.reshape(-1, freqs.size).mean(axis=0)    # average channels
+
+    prominence = []
+    for f in candidates:
+        neighborhood = np.abs(freqs - f) < 5
+        peak = power[np.argmin(np.abs(freqs - f))]
+        prominence.append(peak / np.median(power[neighborhood]))
+
+    return candidates[int(np.argmax(prominence))]
+
+
+# The following filters are causal and stateful, i.e., they can be applied to
+# consecutive chunks of a signal (e.g., during live acquisition). The filter
+# state is kept between calls to push(), so that filtering a signal in chunks
+# gives the same result as filtering it in one go. Note that unlike the
+# functions above, these filters are not zero-phase.
+
+
+class _SosStream:
+
+    def __init__(self, sos):
+        self.sos = sos
+        self.zi = None
+
+    def push(self, chunk):
+        """
+        Parameters
+        ----------
+        chunk : ndarray
+            The next samples of the signal.
+
+        Returns
+        -------
+        filt : ndarray
+            The filtered chunk (same length as chunk).
+        """
+        dtype = float_dtype(chunk)
+        chunk = np.asarray(chunk, dtype=float)
+        if not chunk.size:
+            return chunk.astype(dtype)
+        if self.zi is None:
+            # Initialize the state to the steady state of the first sample in
+            # order to avoid a transient at the beginning of the signal. The
+            # state is kept in double precision regardless of the dtype of
+            # the chunks.
+            self.zi = sosfilt_zi(self.sos) * chunk[0]
+        filt, self.zi = sosfilt(self.sos, chunk, zi=self.zi)
+        return filt.astype(dtype, copy=False)
+
+    def reset(self):
+        self.zi = None
+
+
+class HighpassStream(_SosStream):
+    """Causal counterpart of `butter_highpass_filter`."""
+
+    def __init__(self, cutoff, fs, order=5):
+        super().__init__(filterbank.sos("high", cutoff, fs, order))
+
+
+class LowpassStream(_SosStream):
+    """Causal counterpart of `butter_lowpass_filter`."""
+
+    def __init__(self, cutoff, fs, order=5):
+        super().__init__(filterbank.sos("low", cutoff, fs, order))
+
+
+class BandpassStream(_SosStream):
+    """Causal counterpart of `butter_bandpass_filter`."""
+
+    def __init__(self, lowcut, highcut, fs, order=5):
+        super().__init__(filterbank.sos("band", [lowcut, highcut], fs, order))
+
+
+class MovingAverageStream:
+    """Causal counterpart of `moving_average`. Keeps the last
+    `window_size - 1` samples, hence memory does not grow with the length of
+    the signal. Each output sample is the mean of the current and the
+    preceding `window_size - 1` input samples.
+    """
+
+    def __init__(self, window_size):
+        self.window_size = window_size
+        self.tail = None
+
+    def push(self, chunk):
+        dtype = float_dtype(chunk)
+        chunk = np.asarray(chunk, dtype=float)
+        if not chunk.size:
+            return chunk.astype(dtype)
+        if self.tail is None:
+            # Pad the beginning of the signal with the first sample (steady
+            # state).
+            self.tail = np.full(self.window_size - 1, chunk[0])
+        padded = np.concatenate((self.tail, chunk))
+        csum = np.cumsum(np.insert(padded, 0, 0))
+        avg = (csum[self.window_size:] - csum[:-self.window_size]) / self.window_size
+        self.tail = padded[padded.size - (self.window_size - 1):]
+        return avg.astype(dtype, copy=False)
+
+    def reset(self):
+        self.tail = None
+
+
+class PowerlineStream(MovingAverageStream):
+    """Causal counterpart of `powerline_filter`."""
+
+    def __init__(self, sfreq):
+        window_size = int(sfreq / 50) if sfreq >= 100 else 2
+        super().__init__(window_size)
@@ -1,200 +1,1214 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
-from scipy.signal import find_peaks
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from scipy.signal import find_peaks, resample_poly, sosfreqz
 from .filters import (butter_highpass_filter, powerline_filter,
-                      moving_average, butter_bandpass_filter)
+                      moving_average, moving_averages, butter_bandpass_filter,
+                      HighpassStream, BandpassStream, PowerlineStream,
+                      MovingAverageStream, detect_powerline)
 from .analysis_utils import (compute_threshold, interp_stats, update_indices)
 
+# The core modules (filters, heart, resp, io_utils, analysis_utils) import
+# pandas and matplotlib only in the functions that use them, such that
+# headless applications can import the detectors without loading plotting
+# or data frame libraries.
+
 
 def ecg_peaks(signal, sfreq, smoothwindow=.1, avgwindow=.75,
               gradthreshweight=1.5, minlenweight=0.4, mindelay=.3,
-              enable_plot=False):
+              powerlinefreq=None, workingfreq=None, usable=None,
+              return_details=False, enable_plot=False):
     """
+    powerlinefreq selects the power-line filter (see
+    filters.powerline_filter): None (default) smoothes with a kernel the
+    width of one period of 50 Hz, a frequency (e.g., 50 or 60) applies a notch
+    comb at that frequency and its harmonics, "auto" infers the frequency from
+    the spectrum of the signal.
+
+    If workingfreq is not None and sfreq is at least twice workingfreq, the
+    signal is decimated (polyphase anti-aliasing filter) by an integer factor
+    to a sampling rate close to workingfreq (e.g., 250 Hz), the R-peaks are
+    detected in the decimated signal and subsequently refined in the original
+    signal (i.e., positions are reported at the original sampling rate).
+
+    usable is an optional boolean mask of the same size as signal that is
+    False for unusable parts of the signal (see
+    analysis_utils.signal_quality). QRS complexes that overlap unusable
+    samples are discarded.
+
+    If return_details is True, a dictionary with the intermediate results of
+    the detection is returned in addition to the R-peaks (e.g., to draw the
+    QRS complexes and thresholds):
+
+    - "beg", "end": start and end of all candidate QRS complexes.
+    - "rejected": for each candidate QRS complex, the reason it did not
+      contribute an R-peak ("unusable", "short", "nopeak" if it does not
+      contain a local maximum, "mindelay" if its peak follows the previous
+      R-peak too closely), or "" if it did.
+    - "filtered", "smoothgrad", "threshold": the filtered ECG, its smoothed
+      absolute gradient, and the threshold of the smoothed gradient (not
+      copies of the arrays used by the detection).
+    - "sfreq": the sampling rate of the above (differs from sfreq if the
+      signal has been decimated, see workingfreq).
+
     enable_plot is for debugging and demonstration purposes when the function
     is called in isolation.
     """
-    if enable_plot:
-        plt.figure()
-        ax1 = plt.subplot(211)
-        ax2 = plt.subplot(212, sharex=ax1)
-
-    filt = butter_highpass_filter(signal, .5, sfreq)
-    filt = powerline_filter(filt, sfreq)
-
-    grad = np.gradient(filt)
-    absgrad = np.abs(grad)
-    smoothgrad = moving_average(absgrad, int(np.rint(smoothwindow * sfreq)))
-    avggrad = moving_average(smoothgrad, int(np.rint(avgwindow * sfreq)))
+    if workingfreq is not None and sfreq >= 2 * workingfreq:
+        factor = int(sfreq // workingfreq)
+        decimated = resample_poly(signal, 1, factor)
+        result = ecg_peaks(decimated, sfreq / factor,
+                           smoothwindow=smoothwindow, avgwindow=avgwindow,
+                           gradthreshweight=gradthreshweight,
+                           minlenweight=minlenweight, mindelay=mindelay,
+                           powerlinefreq=powerlinefreq,
+                           usable=None if usable is None else usable[::factor],
+                           return_details=return_details,
+                           enable_plot=enable_plot)
+        if return_details:
+            peaks, details = result
+            return _refine_peaks(signal, peaks * factor, factor), details
+        return _refine_peaks(signal, result * factor, factor)
+
+    filt, absgrad = _ecg_gradient(signal, sfreq, powerlinefreq)
+    smoothgrad = moving_average(absgrad, _window_size(smoothwindow, sfreq))
+    avggrad = moving_average(smoothgrad, _window_size(avgwindow, sfreq))
     gradthreshold = gradthreshweight * avggrad
-    mindelay = int(np.rint(sfreq * mindelay))
-
-    # Visualize thresholds.
-    if enable_plot:
-        ax1.plot(filt)
-        ax2.plot(smoothgrad)
-        ax2.plot(gradthreshold)
 
     # Identify start and end of QRS complexes.
-    qrs = smoothgrad > gradthreshold
-    beg_qrs = np.where(np.logical_and(np.logical_not(qrs[0:-1]), qrs[1:]))[0]
-    end_qrs = np.where(np.logical_and(qrs[0:-1], np.logical_not(qrs[1:])))[0]
-    # Throw out QRS-ends that precede first QRS-start.
-    end_qrs = end_qrs[end_qrs > beg_qrs[0]]
+    beg_qrs, end_qrs = _window_bounds(smoothgrad > gradthreshold)
+    rejected = np.full(beg_qrs.size, "", dtype="<U8")
+    if usable is not None:
+        rejected[~_usable_windows(usable, beg_qrs, end_qrs)] = "unusable"
 
     # Identify R-peaks within QRS (ignore QRS that are too short).
-    num_qrs = min(beg_qrs.size, end_qrs.size)
-    min_len = np.mean(end_qrs[:num_qrs] - beg_qrs[:num_qrs]) * minlenweight
-    peaks = [0]
+    valid = np.flatnonzero(rejected == "")
+    long_qrs = _long_qrs(end_qrs[valid] - beg_qrs[valid], minlenweight)
+    rejected[valid[~long_qrs]] = "short"
+    keep = rejected == ""
+
+    # Identify the most prominent local maximum within each QRS and enforce
+    # minimum delay between peaks.
+    candidates = _window_peaks(signal, beg_qrs[keep], end_qrs[keep])
+    peaks = _enforce_mindelay(candidates, int(np.rint(sfreq * mindelay)))
+
+    if not (return_details or enable_plot):
+        return peaks
+
+    details = _detection_details(beg_qrs, end_qrs, rejected, candidates,
+                                 peaks, filtered=filt, smoothgrad=smoothgrad,
+                                 threshold=gradthreshold, sfreq=sfreq)
+    if enable_plot:
+        _plot_ecg(peaks, details)
+
+    return (peaks, details) if return_details else peaks
 
-    for beg, end in zip(beg_qrs, end_qrs):
 
-        len_qrs = end - beg
-        if len_qrs < min_len:
-            continue
+def _ecg_gradient(signal, sfreq, powerlinefreq=None):
+    """The stages of ecg_peaks that do not depend on the detection parameters:
+    the filtered ECG and its absolute gradient."""
+    filt = butter_highpass_filter(signal, .5, sfreq)
+    filt = powerline_filter(filt, sfreq, freq=powerlinefreq)
+    absgrad = np.abs(np.gradient(filt))
 
-        # Visualize QRS intervals.
-        if enable_plot:
-            ax2.axvspan(beg, end, facecolor="m", alpha=0.5)
+    return filt, absgrad
 
-        # Find local maxima and their prominence within QRS.
-        data = signal[beg:end]
-        locmax, props = find_peaks(data, prominence=(None, None))
 
-        if locmax.size > 0:
-            # Identify most prominent local maximum.
-            peak = beg + locmax[np.argmax(props["prominences"])]
-            # Enforce minimum delay between peaks.
-            if peak - peaks[-1] > mindelay:
-                peaks.append(peak)
+def _window_size(duration, sfreq):
+    """Width in samples of a moving average over duration seconds (at least
+    one sample)."""
+    return max(int(np.rint(duration * sfreq)), 1)
 
-    peaks.pop(0)
 
-    if enable_plot:
-        ax1.scatter(peaks, filt[peaks], c="r")
+def _window_bounds(inwindow):
+    """Start and end of the windows (e.g., QRS complexes) in which inwindow is
+    True. Ends that precede the first start and a start without end are
+    thrown out."""
+    begs = np.where(np.logical_and(np.logical_not(inwindow[0:-1]),
+                                   inwindow[1:]))[0]
+    ends = np.where(np.logical_and(inwindow[0:-1],
+                                   np.logical_not(inwindow[1:])))[0]
+    if not begs.size:
+        return begs, ends[:0]
+    ends = ends[ends > begs[0]]
+    num_windows = min(begs.size, ends.size)
+
+    return begs[:num_windows], ends[:num_windows]
+
+
+def _usable_windows(usable, begs, ends):
+    """Mask of the windows that do not overlap any unusable sample."""
+    n_unusable = np.concatenate(([0], np.cumsum(np.logical_not(usable))))
+
+    return n_unusable[ends + 1] == n_unusable[begs]
+
+
+def _detection_details(begs, ends, rejected, candidates, peaks, **arrays):
+    """Assemble the details of a detection (see ecg_peaks and ppg_peaks). The
+    windows that have not been rejected yet are rejected if they do not
+    contain a candidate peak, or if their candidate peak has been dropped by
+    the minimum delay."""
+    rejected = rejected.copy()
+    windows = np.searchsorted(begs, candidates, side="right") - 1
+    nopeak = np.setdiff1d(np.flatnonzero(rejected == ""), windows)
+    rejected[nopeak] = "nopeak"
+    rejected[windows[~np.isin(candidates, peaks)]] = "mindelay"
+
+    return {"beg": begs, "end": ends, "rejected": rejected, **arrays}
+
+
+def _plot_ecg(peaks, details):
+    """Visualize the details of ecg_peaks."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2) = plt.subplots(nrows=2, ncols=1, sharex=True)
+    ax1.plot(details["filtered"])
+    ax2.plot(details["smoothgrad"])
+    ax2.plot(details["threshold"])
+    # Visualize the QRS complexes that are long enough.
+    searched = ~np.isin(details["rejected"], ["unusable", "short"])
+    for beg, end in zip(details["beg"][searched], details["end"][searched]):
+        ax2.axvspan(beg, end, facecolor="m", alpha=0.5)
+    ax1.scatter(peaks, details["filtered"][peaks], c="r")
+
+
+def _plot_ppg(signal, peaks, details):
+    """Visualize the details of ppg_peaks."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax0, ax1) = plt.subplots(nrows=2, ncols=1, sharex=True)
+    ax0.plot(signal)
+    ax1.plot(details["filtered"], label="filtered")
+    ax1.plot(details["energy"], label="squared")
+    ax1.plot(details["threshold"], label="threshold")
+    ax1.legend(loc="upper right")
+    # Visualize the wave spans that are long enough.
+    searched = ~np.isin(details["rejected"], ["unusable", "short"])
+    for beg, end in zip(details["beg"][searched], details["end"][searched]):
+        ax1.axvspan(beg, end, facecolor="m", alpha=0.5)
+    ax0.scatter(peaks, signal[peaks], c="r")
+
+
+def _long_qrs(len_qrs, minlenweight):
+    """Mask of the QRS complexes that are at least minlenweight times as long
+    as the average QRS complex."""
+    if not len_qrs.size:
+        return len_qrs.astype(bool)
+    min_len = np.mean(len_qrs) * minlenweight
+
+    return len_qrs >= min_len
+
+
+def _refine_peaks(signal, peaks, halfwidth):
+    """Move each peak to the maximum of signal within peak +- halfwidth
+    samples."""
+    if not peaks.size:
+        return peaks
+    window = peaks[:, None] + np.arange(-halfwidth, halfwidth + 1)
+    np.clip(window, 0, signal.size - 1, out=window)
+    refined = window[np.arange(peaks.size), np.argmax(signal[window], axis=1)]
+
+    return np.unique(refined)
+
+
+def _window_peaks(signal, begs, ends, blocksize=2**18):
+    """Find the most prominent local maximum of signal within each window.
+
+    Equivalent to calling scipy.signal.find_peaks(signal[beg:end],
+    prominence=(None, None)) for each window and selecting the local maximum
+    with the largest prominence, but all windows are handled at once.
+
+    Parameters
+    ----------
+    signal : ndarray
+        One-dimensional signal.
+    begs, ends : ndarray
+        Start (inclusive) and end (exclusive) samples of the windows. The
+        windows must be sorted and must not overlap.
+    blocksize : int, optional
+        Approximate number of window samples that are processed at once. Limits
+        the memory used by the range tables.
+
+    Returns
+    -------
+    peaks : ndarray
+        The peak of each window that contains at least one local maximum.
+    """
+    begs = np.asarray(begs, dtype=int)
+    ends = np.asarray(ends, dtype=int)
+    if not begs.size:
+        return np.array([], dtype=int)
+
+    # Local maxima (including the plateau edges) of the entire signal. A local
+    # maximum is a local maximum of a window if its plateau and the lower
+    # samples flanking the plateau are inside the window.
+    locmax, props = find_peaks(signal, plateau_size=(None, None))
+    windows = np.searchsorted(begs, locmax, side="right") - 1
+    inside = windows >= 0
+    windows[~inside] = 0
+    inside &= props["left_edges"] > begs[windows]
+    inside &= props["right_edges"] < ends[windows] - 1
+    locmax = locmax[inside]
+    windows = windows[inside]
+    if not locmax.size:
+        return np.array([], dtype=int)
+
+    # Only keep the windows that contain local maxima.
+    uniquewindows, windows = np.unique(windows, return_inverse=True)
+    begs = begs[uniquewindows]
+    lens = ends[uniquewindows] - begs
+
+    prominences = np.empty(locmax.size)
+    cumlens = np.cumsum(lens)
+    first = 0
+    while first < begs.size:
+        last = max(first + 1, np.searchsorted(cumlens, cumlens[first] -
+                                              lens[first] + blocksize,
+                                              side="right"))
+        members = slice(*np.searchsorted(windows, [first, last]))
+        prominences[members] = _window_prominences(signal, begs[first:last],
+                                                   lens[first:last],
+                                                   locmax[members],
+                                                   windows[members] - first)
+        first = last
+
+    # Select the first local maximum with the largest prominence in each
+    # window (the local maxima are sorted by window).
+    starts = np.flatnonzero(np.diff(windows, prepend=-1))
+    maxprominence = np.maximum.reduceat(prominences, starts)
+    counts = np.diff(np.append(starts, windows.size))
+    ismax = np.flatnonzero(prominences == np.repeat(maxprominence, counts))
+    _, firstmax = np.unique(windows[ismax], return_index=True)
+
+    return locmax[ismax[firstmax]]
+
+
+def _window_prominences(signal, begs, lens, locmax, windows):
+    """Prominences of the local maxima within their windows.
+
+    Like in scipy.signal.peak_prominences, the bases on either side of a local
+    maximum are the minima between the local maximum and the closest higher
+    sample (or the edge of the window). The windows are concatenated and the
+    closest higher samples are found by binary lifting on a sparse table of
+    range maxima (level k holds the maximum of 2**k consecutive samples).
+    """
+    # Concatenate the windows.
+    offsets = np.cumsum(lens) - lens
+    idcs = np.repeat(begs - offsets, lens) + np.arange(lens.sum())
+    data = signal[idcs]
+    n_samples = data.size
+    n_levels = np.frexp(lens.max())[1]
+    maxs = np.empty((n_levels, n_samples), dtype=data.dtype)
+    mins = np.empty((n_levels, n_samples), dtype=data.dtype)
+    maxs[0] = mins[0] = data
+    for level in range(1, n_levels):
+        half = 2 ** (level - 1)
+        maxs[level] = maxs[level - 1]
+        mins[level] = mins[level - 1]
+        np.maximum(maxs[level - 1, :-half], maxs[level - 1, half:],
+                   out=maxs[level, :-half])
+        np.minimum(mins[level - 1, :-half], mins[level - 1, half:],
+                   out=mins[level, :-half])
+
+    peaks = locmax - begs[windows] + offsets[windows]
+    heights = data[peaks]
+    winbegs = offsets[windows]
+    winends = winbegs + lens[windows]
+
+    # Extend [left, right) from the local maximum as long as no sample is
+    # higher than the local maximum, without leaving the window.
+    left = peaks.copy()
+    right = peaks + 1
+    for level in reversed(range(n_levels)):
+        step = 2 ** level
+        extend = left - step >= winbegs
+        candidates = np.where(extend, left - step, 0)
+        extend &= maxs[level, candidates] <= heights
+        left = np.where(extend, candidates, left)
+        extend = right + step <= winends
+        candidates = np.where(extend, right, 0)
+        extend &= maxs[level, candidates] <= heights
+        right = np.where(extend, right + step, right)
+
+    def rangemin(beg, end):
+        level = np.frexp(end - beg)[1] - 1
+        return np.minimum(mins[level, beg], mins[level, end - 2 ** level])
+
+    leftmin = rangemin(left, peaks + 1)
+    rightmin = rangemin(peaks, right)
+
+    return (heights.astype(np.float64) -
+            np.maximum(leftmin, rightmin).astype(np.float64))
+
+
+def _enforce_mindelay(peaks, mindelay):
+    """Scan the sorted peaks and keep a peak only if it is more than mindelay
+    samples later than the last kept peak (the first peak must be later than
+    mindelay samples as well).
+
+    The chain of kept peaks is found with pointer doubling: each peak points
+    to the first peak that is more than mindelay samples later, and the pointers
+    are followed from the first kept peak in log2(peaks.size) array operations.
+    """
+    n_peaks = peaks.size
+    first = np.searchsorted(peaks, mindelay, side="right")
+    if first == n_peaks:
+        return np.array([], dtype=int)
+
+    # Index n_peaks is a sentinel pointing to itself.
+    pointers = np.append(np.searchsorted(peaks, peaks + mindelay,
+                                         side="right"), n_peaks)
+    kept = np.zeros(n_peaks + 1, dtype=bool)
+    kept[first] = True
+    steps = 1
+    while steps < n_peaks:
+        kept[pointers[kept]] = True
+        pointers = pointers[pointers]
+        steps *= 2
+    kept[pointers[kept]] = True
+
+    return peaks[kept[:-1]].astype(int)
+
+
+executors = {"threads": ThreadPoolExecutor,
+             "processes": ProcessPoolExecutor}
+
+
+def ecg_peaks_parallel(signal, sfreq, smoothwindow=.1, avgwindow=.75,
+                       gradthreshweight=1.5, minlenweight=0.4, mindelay=.3,
+                       powerlinefreq=None, usable=None, chunklength=600,
+                       overlap=20, n_jobs=None, executor="threads"):
+    """Detect R-peaks like ecg_peaks, with the signal split into chunks that
+    are processed concurrently (for long recordings).
+
+    Each chunk of chunklength seconds is padded with overlap seconds of the
+    neighboring signal on both sides, such that the transients of the filters
+    at the edges of the padded chunk have decayed before they reach the chunk
+    (the impulse response of the .5 Hz highpass filter lasts about 12
+    seconds). A QRS complex belongs to the chunk in which it begins. The
+    minimum length of QRS complexes (minlenweight) is computed from all QRS
+    complexes, and the minimum delay between R-peaks (mindelay) is enforced
+    on the stitched R-peaks. Hence, barring differences in the order of
+    floating point precision at the edges of the chunks, the R-peaks are
+    identical to those of ecg_peaks.
+
+    usable is an optional mask of usable samples (see ecg_peaks).
+
+    n_jobs is the number of workers, by default None (number of processors).
+    executor is "threads" (default) or "processes". The filters and most of
+    the search release the GIL, processes additionally require copying the
+    chunks to the workers.
+    """
+    if powerlinefreq == "auto":
+        # Infer the power-line frequency once for all chunks.
+        powerlinefreq = detect_powerline(signal, sfreq)
+    n_samples = signal.size
+    chunksize = max(int(np.rint(chunklength * sfreq)), 1)
+    padsize = int(np.rint(overlap * sfreq))
+    begs = np.arange(0, n_samples, chunksize)
+    ends = np.minimum(begs + chunksize, n_samples)
+    padbegs = np.maximum(begs - padsize, 0)
+    padends = np.minimum(ends + padsize, n_samples)
+
+    with executors[executor](max_workers=n_jobs) as pool:
+
+        qrs = pool.map(_ecg_chunk_qrs,
+                       [signal[b:e] for b, e in zip(padbegs, padends)],
+                       [sfreq] * begs.size, [smoothwindow] * begs.size,
+                       [avgwindow] * begs.size,
+                       [gradthreshweight] * begs.size,
+                       [powerlinefreq] * begs.size)
+        beg_qrs = []
+        end_qrs = []
+        for beg, end, padbeg, (beg_chunk, end_chunk) in zip(begs, ends,
+                                                            padbegs, qrs):
+            beg_chunk += padbeg
+            end_chunk += padbeg
+            owned = np.logical_and(beg_chunk >= beg, beg_chunk < end)
+            beg_chunk = beg_chunk[owned]
+            end_chunk = end_chunk[owned]
+            if usable is not None:
+                keep = _usable_windows(usable, beg_chunk, end_chunk)
+                beg_chunk = beg_chunk[keep]
+                end_chunk = end_chunk[keep]
+            beg_qrs.append(beg_chunk)
+            end_qrs.append(end_chunk)
+
+        keep = _long_qrs(np.concatenate(end_qrs) - np.concatenate(beg_qrs),
+                         minlenweight)
+        splits = np.cumsum([b.size for b in beg_qrs])[:-1]
+        keep = np.split(keep, splits)
+        beg_qrs = [b[k] - p for b, k, p in zip(beg_qrs, keep, padbegs)]
+        end_qrs = [e[k] - p for e, k, p in zip(end_qrs, keep, padbegs)]
+
+        peaks = pool.map(_window_peaks,
+                         [signal[b:e] for b, e in zip(padbegs, padends)],
+                         beg_qrs, end_qrs)
+        peaks = np.concatenate([p + padbeg for p, padbeg in zip(peaks,
+                                                                padbegs)])
+
+    # Each QRS complex is owned by a single chunk, drop duplicates anyway.
+    peaks = np.unique(peaks)
+
+    return _enforce_mindelay(peaks, int(np.rint(sfreq * mindelay)))
+
+
+def _ecg_chunk_qrs(chunk, sfreq, smoothwindow, avgwindow, gradthreshweight,
+                   powerlinefreq):
+    """Start and end of the QRS complexes in a chunk of the ECG (see
+    ecg_peaks_parallel)."""
+    _, absgrad = _ecg_gradient(chunk, sfreq, powerlinefreq)
+    smoothgrad = moving_average(absgrad, _window_size(smoothwindow, sfreq))
+    avggrad = moving_average(smoothgrad, _window_size(avgwindow, sfreq))
+
+    return _window_bounds(smoothgrad > gradthreshweight * avggrad)
+
+
+class _PeakDetector:
+    """Shared machinery of the online peak detectors. Keeps the signal in a
+    ring buffer, tracks the boundaries of the windows (QRS complexes or PPG
+    waves) across chunks, and searches the most prominent local maximum in
+    each completed window.
+
+    Subclasses implement `_windows(samples, start)`, returning the start and
+    end samples of the windows that are completed by the samples. Since the
+    detection signal is delayed by causal filtering, the windows must be
+    shifted back by that delay.
+    """
+
+    def __init__(self, sfreq, mindelay, bufferlength):
+        self.sfreq = sfreq
+        self.mindelay = int(np.rint(sfreq * mindelay))
+        self._buffer = np.zeros(int(np.rint(bufferlength * sfreq)))
+
+    def push(self, samples):
+        """
+        Parameters
+        ----------
+        samples : ndarray
+            The next samples of the signal.
+
+        Returns
+        -------
+        peaks : ndarray
+            The peaks (sample indices counted from the first sample pushed
+            since the last reset) that have been completed by the samples.
+        """
+        samples = np.ravel(samples).astype(float)
+        if not samples.size:
+            return np.array([], dtype=int)
+        # Process long chunks in blocks of half the buffer, such that windows
+        # reaching back into the previous block are still buffered.
+        blocksize = max(1, self._buffer.size // 2)
+        if samples.size > blocksize:
+            return np.concatenate([self.push(samples[beg:beg + blocksize])
+                                   for beg in range(0, samples.size,
+                                                    blocksize)])
+        start = self._n_samples
+        self._write(samples)
+        begs, ends = self._windows(samples, start)
+
+        return self._search(begs, ends)
+
+    def reset(self):
+        self._n_samples = 0
+        self._inwindow = None
+        self._windowbeg = None
+        self._lastpeak = 0
+
+    def _write(self, samples):
+        """Append samples to the ring buffer."""
+        n_new = min(samples.size, self._buffer.size)
+        idcs = np.arange(self._n_samples + samples.size - n_new,
+                         self._n_samples + samples.size)
+        self._buffer[idcs % self._buffer.size] = samples[-n_new:]
+        self._n_samples += samples.size
+
+    def _boundaries(self, inwindow, start):
+        """Start and end of the windows (same convention as the batch
+        detectors) that are completed in the chunk starting at sample start,
+        including a window that started in a previous chunk."""
+        inwindow = np.insert(inwindow, 0, inwindow[0] if self._inwindow is None
+                             else self._inwindow)
+        self._inwindow = inwindow[-1]
+        begs = start - 1 + np.flatnonzero(~inwindow[:-1] & inwindow[1:])
+        ends = start - 1 + np.flatnonzero(inwindow[:-1] & ~inwindow[1:])
+        if self._windowbeg is not None:
+            begs = np.insert(begs, 0, self._windowbeg)
+        ends = ends[ends > begs[0]] if begs.size else ends[:0]
+        n_windows = ends.size
+        self._windowbeg = begs[n_windows] if begs.size > n_windows else None
+
+        return begs[:n_windows], ends
+
+    def _search(self, begs, ends):
+        """Identify the most prominent local maximum of the buffered signal
+        within each window and enforce minimum delay between peaks."""
+        # Map the windows to the signal in the ring buffer.
+        oldest = max(0, self._n_samples - self._buffer.size)
+        begs = np.maximum(begs, oldest)
+        ends = np.maximum(ends, oldest)
+        nonempty = ends > begs
+        begs = begs[nonempty]
+        lens = ends[nonempty] - begs
+        if not begs.size:
+            return np.array([], dtype=int)
+        offsets = np.cumsum(lens) - lens
+        idcs = np.repeat(begs - offsets, lens) + np.arange(lens.sum())
+        data = self._buffer[idcs % self._buffer.size]
+
+        locmax = _window_peaks(data, offsets, offsets + lens)
+        windows = np.searchsorted(offsets, locmax, side="right") - 1
+        peaks = locmax - offsets[windows] + begs[windows]
+        peaks = _enforce_mindelay(peaks - self._lastpeak,
+                                  self.mindelay) + self._lastpeak
+        if peaks.size:
+            self._lastpeak = peaks[-1]
+
+        return peaks
+
+
+class EcgPeakDetector(_PeakDetector):
+    """Online counterpart of `ecg_peaks`. Samples are pushed in chunks of
+    arbitrary size, and each R-peak is returned as soon as its QRS complex has
+    ended (i.e., with a latency of roughly the filter delay plus the duration
+    of the QRS complex).
+
+    In contrast to ecg_peaks, the filters and moving averages are causal. The
+    QRS boundaries are therefore shifted back by the delay of the filters
+    before the R-peaks are searched in the signal. Furthermore, the minimal
+    QRS length is based on the running mean of the lengths of the QRS
+    complexes so far, rather than on the mean of all QRS complexes in the
+    signal. Memory is constant: the signal is kept in a ring buffer of
+    bufferlength seconds (QRS complexes longer than half the buffer may be
+    truncated).
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling rate of the signal.
+    smoothwindow, avgwindow, gradthreshweight, minlenweight, mindelay : float
+        See ecg_peaks.
+    bufferlength : float, optional
+        Duration of the ring buffer in seconds.
+
+    Examples
+    --------
+    >>> detector = EcgPeakDetector(sfreq)
+    >>> for chunk in chunks:
+    ...     new_peaks = detector.push(chunk)
+    """
+
+    def __init__(self, sfreq, smoothwindow=.1, avgwindow=.75,
+                 gradthreshweight=1.5, minlenweight=0.4, mindelay=.3,
+                 bufferlength=2):
+        super().__init__(sfreq, mindelay, bufferlength)
+        self.gradthreshweight = gradthreshweight
+        self.minlenweight = minlenweight
+
+        smoothsize = _window_size(smoothwindow, sfreq)
+        self._highpass = HighpassStream(.5, sfreq)
+        self._powerline = PowerlineStream(sfreq)
+        self._smooth = MovingAverageStream(smoothsize)
+        self._avg = MovingAverageStream(_window_size(avgwindow, sfreq))
+        # Delay (in samples) of the smoothed gradient with respect to the
+        # signal: the causal moving averages are delayed by half their width,
+        # the gradient by one sample.
+        self.delay = int(np.rint((self._powerline.window_size - 1) / 2 + 1 +
+                                 (smoothsize - 1) / 2))
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._highpass.reset()
+        self._powerline.reset()
+        self._smooth.reset()
+        self._avg.reset()
+        self._filttail = None
+        self._qrslensum = 0
+        self._n_qrs = 0
+
+    def _windows(self, samples, start):
+
+        filt = self._powerline.push(self._highpass.push(samples))
+        if self._filttail is None:
+            self._filttail = np.full(2, filt[0])
+        padded = np.concatenate((self._filttail, filt))
+        self._filttail = padded[-2:]
+        # Central differences like np.gradient, delayed by one sample.
+        absgrad = np.abs(padded[2:] - padded[:-2]) / 2
+        smoothgrad = self._smooth.push(absgrad)
+        gradthreshold = self.gradthreshweight * self._avg.push(smoothgrad)
+
+        # Identify start and end of QRS complexes.
+        beg_qrs, end_qrs = self._boundaries(smoothgrad > gradthreshold, start)
+        if not beg_qrs.size:
+            return beg_qrs, end_qrs
+
+        # Ignore QRS that are too short compared to the running mean of the
+        # QRS lengths.
+        len_qrs = end_qrs - beg_qrs
+        lensum = self._qrslensum + np.cumsum(len_qrs)
+        n_qrs = self._n_qrs + np.arange(1, len_qrs.size + 1)
+        self._qrslensum = lensum[-1]
+        self._n_qrs = n_qrs[-1]
+        keep = len_qrs >= lensum / n_qrs * self.minlenweight
+
+        return beg_qrs[keep] - self.delay, end_qrs[keep] - self.delay
+
+
+class PpgPeakDetector(_PeakDetector):
+    """Online counterpart of `ppg_peaks`. Samples are pushed in chunks of
+    arbitrary size, and each systolic peak is returned as soon as its wave
+    span has ended.
+
+    In contrast to ppg_peaks, the bandpass filter and the moving averages are
+    causal, and the offset of the threshold is based on the running mean of
+    the squared signal rather than on the mean of the entire signal. The
+    shorter of the moving averages (usually the one over peakwindow) is
+    delayed to line up with the longer one. Before the systolic peaks are
+    searched in the signal, the wave spans are shifted back by the delay of
+    the moving averages and the phase delay of the bandpass filter at the
+    pulse rate (estimated from the running mean of the intervals between wave
+    spans). Memory and cost per sample are constant.
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling rate of the signal.
+    peakwindow, beatwindow, beatoffset, mindelay : float
+        See ppg_peaks.
+    bufferlength : float, optional
+        Duration of the ring buffer in seconds.
+    """
 
-    return np.asarray(peaks).astype(int)
+    def __init__(self, sfreq, peakwindow=.111, beatwindow=.667,
+                 beatoffset=.02, mindelay=.3, bufferlength=4):
+        super().__init__(sfreq, mindelay, bufferlength)
+        self.beatoffset = beatoffset
+        self.min_len = int(np.rint(peakwindow * sfreq))
+
+        peaksize = _window_size(peakwindow, sfreq)
+        beatsize = _window_size(beatwindow, sfreq)
+        self._bandpass = BandpassStream(.5, 8, sfreq, order=3)
+        self._peak = MovingAverageStream(peaksize)
+        self._beat = MovingAverageStream(beatsize)
+        self._peaklag = max(beatsize - peaksize, 0) // 2
+        self._beatlag = max(peaksize - beatsize, 0) // 2
+        # Phase delay (in samples) of the bandpass filter over the range of
+        # plausible pulse rates (in Hz), plus the delay of the longer moving
+        # average.
+        self._rates = np.linspace(.5, 4, 36)
+        _, response = sosfreqz(self._bandpass.sos, worN=self._rates, fs=sfreq)
+        self._delays = ((max(beatsize, peaksize) - 1) / 2 - np.unwrap(np.angle(response)) /
+                        (2 * np.pi * self._rates) * sfreq)
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._bandpass.reset()
+        self._peak.reset()
+        self._beat.reset()
+        self._tails = {}
+        self._sqrdsum = 0
+        self._n_sqrd = 0
+        self._lastbeg = None
+        self._intervalsum = 0
+        self._n_intervals = 0
+
+    def _windows(self, samples, start):
+
+        filt = self._bandpass.push(samples)
+        filt[filt < 0] = 0
+        sqrd = filt**2
+
+        ma_peak = self._peak.push(sqrd)
+        ma_beat = self._beat.push(sqrd)
+        # Delay the shorter moving average by the difference in delay of the
+        # moving averages.
+        ma_peak = self._delay("peak", ma_peak, self._peaklag)
+        ma_beat = self._delay("beat", ma_beat, self._beatlag)
+        # Running mean of the squared signal.
+        sqrdsum = self._sqrdsum + np.cumsum(sqrd)
+        n_sqrd = self._n_sqrd + np.arange(1, sqrd.size + 1)
+        self._sqrdsum = sqrdsum[-1]
+        self._n_sqrd = n_sqrd[-1]
+        thr1 = ma_beat + self.beatoffset * sqrdsum / n_sqrd
+
+        # Identify start and end of PPG waves (ignore waves that are too
+        # short).
+        beg_waves, end_waves = self._boundaries(ma_peak > thr1, start)
+        keep = end_waves - beg_waves >= self.min_len
+        beg_waves = beg_waves[keep]
+        end_waves = end_waves[keep]
+        if not beg_waves.size:
+            return beg_waves, end_waves
+
+        # Running mean of the intervals between wave spans. Before the first
+        # interval is available, a pulse rate of 1 Hz is assumed.
+        intervals = np.diff(beg_waves, prepend=(beg_waves[0] if self._lastbeg
+                                                is None else self._lastbeg))
+        intervalsum = self._intervalsum + np.cumsum(intervals)
+        n_intervals = self._n_intervals + np.cumsum(intervals > 0)
+        self._lastbeg = beg_waves[-1]
+        self._intervalsum = intervalsum[-1]
+        self._n_intervals = n_intervals[-1]
+        rates = np.full(beg_waves.size, 1.)
+        measured = n_intervals > 0
+        rates[measured] = (self.sfreq * n_intervals[measured] /
+                           intervalsum[measured])
+        delays = np.rint(np.interp(rates, self._rates,
+                                   self._delays)).astype(int)
+
+        return beg_waves - delays, end_waves - delays
+
+    def _delay(self, name, samples, lag):
+        """Delay the samples by lag samples across chunks, padding the start
+        with the first sample."""
+        tail = self._tails.get(name)
+        if tail is None:
+            tail = np.full(lag, samples[0])
+        padded = np.concatenate((tail, samples))
+        self._tails[name] = padded[samples.size:]
+
+        return padded[:samples.size]
 
 
 def ppg_peaks(signal, sfreq, peakwindow=.111, beatwindow=.667, beatoffset=.02,
-              mindelay=.3, enable_plot=False):
+              mindelay=.3, usable=None, return_details=False,
+              enable_plot=False):
     """
     Implementation of Elgendi M, Norton I, Brearley M, Abbott D, Schuurmans D
     (2013) Systolic Peak Detection in Acceleration Photoplethysmograms Measured
     from Emergency Responders in Tropical Conditions. PLoS ONE 8(10): e76585.
     doi:10.1371/journal.pone.0076585.
 
+    usable is an optional boolean mask of the same size as signal that is
+    False for unusable parts of the signal (see
+    analysis_utils.signal_quality). Waves that overlap unusable samples are
+    discarded.
+
+    If return_details is True, a dictionary with the intermediate results of
+    the detection is returned in addition to the systolic peaks: "beg",
+    "end", and "rejected" for the candidate waves (see ecg_peaks), as well as
+    the "filtered" PPG, its squared values ("energy"), the moving average of
+    the energy over peakwindow ("mapeak"), the "threshold" of mapeak, and
+    the "sfreq".
+
     Enable_plot is for debugging and demonstration purposes when the function
     is called in isolation.
     """
+    filt, sqrd = _ppg_energy(signal, sfreq)
 
-    if enable_plot:
-        fig, (ax0, ax1) = plt.subplots(nrows=2, ncols=1, sharex=True)
-
-    filt = butter_bandpass_filter(signal, lowcut=.5, highcut=8, fs=sfreq,
-                                  order=3)
-    filt[filt < 0] = 0
-    sqrd = filt**2
-
-    ma_peak = moving_average(sqrd, int(np.rint(peakwindow * sfreq)))
-    ma_beat = moving_average(sqrd, int(np.rint(beatwindow * sfreq)))
+    # Both moving averages are computed from the same cumulative sum.
+    ma_peak, ma_beat = moving_averages(sqrd,
+                                       [_window_size(peakwindow, sfreq),
+                                        _window_size(beatwindow, sfreq)])
     thr1 = ma_beat + beatoffset * np.mean(sqrd)
 
-    if enable_plot:
-        ax0.plot(signal)
-        ax1.plot(filt, label="filtered")
-        ax1.plot(sqrd, label="squared")
-        ax1.plot(thr1, label="threshold")
-        ax1.legend(loc="upper right")
-
     # Identify start and end of PPG waves.
-    waves = ma_peak > thr1
-    beg_waves = np.where(np.logical_and(np.logical_not(waves[0:-1]),
-                                        waves[1:]))[0]
-    end_waves = np.where(np.logical_and(waves[0:-1],
-                                        np.logical_not(waves[1:])))[0]
-    # Throw out wave-ends that precede first wave-start.
-    end_waves = end_waves[end_waves > beg_waves[0]]
+    beg_waves, end_waves = _window_bounds(ma_peak > thr1)
+    rejected = np.full(beg_waves.size, "", dtype="<U8")
+    if usable is not None:
+        rejected[~_usable_windows(usable, beg_waves, end_waves)] = "unusable"
 
     # Identify systolic peaks within waves (ignore waves that are too short).
     min_len = int(np.rint(peakwindow * sfreq))
     min_delay = int(np.rint(mindelay * sfreq))
-    peaks = [0]
-
-    for beg, end in zip(beg_waves, end_waves):
+    rejected[np.logical_and(rejected == "",
+                            end_waves - beg_waves < min_len)] = "short"
+    keep = rejected == ""
 
-        len_wave = end - beg
-        if len_wave < min_len:
-            continue
+    # Identify the most prominent local maximum within each wave span and
+    # enforce minimum delay between peaks.
+    candidates = _window_peaks(signal, beg_waves[keep], end_waves[keep])
+    peaks = _enforce_mindelay(candidates, min_delay)
 
-        # Visualize wave span.
-        if enable_plot:
-            ax1.axvspan(beg, end, facecolor="m", alpha=0.5)
+    if not (return_details or enable_plot):
+        return peaks
 
-        # Find local maxima and their prominence within wave span.
-        data = signal[beg:end]
-        locmax, props = find_peaks(data, prominence=(None, None))
+    details = _detection_details(beg_waves, end_waves, rejected, candidates,
+                                 peaks, filtered=filt, energy=sqrd,
+                                 mapeak=ma_peak, threshold=thr1, sfreq=sfreq)
+    if enable_plot:
+        _plot_ppg(signal, peaks, details)
 
-        if locmax.size > 0:
-            # Identify most prominent local maximum.
-            peak = beg + locmax[np.argmax(props["prominences"])]
-            # Enforce minimum delay between peaks.
-            if peak - peaks[-1] > min_delay:
-                peaks.append(peak)
+    return (peaks, details) if return_details else peaks
 
-    peaks.pop(0)
 
-    if enable_plot:
-        ax0.scatter(peaks, signal[peaks], c="r")
+def _ppg_energy(signal, sfreq):
+    """The stages of ppg_peaks that do not depend on the detection parameters:
+    the filtered PPG clipped at zero, and its square."""
+    filt = butter_bandpass_filter(signal, lowcut=.5, highcut=8, fs=sfreq,
+                                  order=3)
+    filt[filt < 0] = 0
+    sqrd = filt**2
 
-    return np.asarray(peaks).astype(int)
+    return filt, sqrd
+
+
+def ecg_peaks_sweep(signal, sfreq, smoothwindow=(.1,), avgwindow=(.75,),
+                    gradthreshweight=(1.5,), minlenweight=(0.4,),
+                    mindelay=(.3,), powerlinefreq=None, annotation=None,
+                    tolerance=.05):
+    """Run ecg_peaks for every combination of the parameter values.
+
+    The parameter sets are passed to an EcgTuner in an order that changes the
+    later parameters first. Hence, each stage of ecg_peaks is computed once
+    per combination of the parameters it depends on: the filtered signal and
+    its gradient once, the smoothed gradient once per smoothwindow, the
+    threshold once per smoothwindow and avgwindow, the QRS complexes and
+    their most prominent local maxima once per smoothwindow, avgwindow, and
+    gradthreshweight. The peaks of each parameter set are identical to the
+    peaks returned by ecg_peaks with the same parameters.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The ECG.
+    sfreq : float
+        Sampling rate of the ECG.
+    smoothwindow, avgwindow, gradthreshweight, minlenweight, mindelay : list
+        The values of each parameter (see ecg_peaks).
+    powerlinefreq : None, float, or str, optional
+        See ecg_peaks.
+    annotation : ndarray, optional
+        Reference R-peaks (samples). If supplied, the peaks of each parameter
+        set are scored against the annotation.
+    tolerance : float, optional
+        Maximum distance in seconds between a peak and an annotated peak to
+        count as a match, by default .05.
+
+    Returns
+    -------
+    results : list of dict
+        One dictionary per parameter set, containing the parameter values,
+        the "peaks", and (if an annotation is supplied) the "sensitivity"
+        and "precision".
+    """
+    tuner = EcgTuner(signal, sfreq, powerlinefreq)
+    grid = {"smoothwindow": smoothwindow,
+            "avgwindow": avgwindow,
+            "gradthreshweight": gradthreshweight,
+            "minlenweight": minlenweight,
+            "mindelay": mindelay}
+
+    return _sweep(tuner, grid, annotation, tolerance)
+
+
+def ppg_peaks_sweep(signal, sfreq, peakwindow=(.111,), beatwindow=(.667,),
+                    beatoffset=(.02,), mindelay=(.3,), annotation=None,
+                    tolerance=.05):
+    """Run ppg_peaks for every combination of the parameter values.
+
+    The parameter sets are passed to a PpgTuner in an order that changes the
+    later parameters first. Hence, the filtered signal is computed once, the
+    moving average over peakwindow once per peakwindow, the moving average
+    over beatwindow once per peakwindow and beatwindow, and the wave spans
+    and their most prominent local maxima once per peakwindow, beatwindow,
+    and beatoffset. The peaks of each parameter set are identical to the
+    peaks returned by ppg_peaks with the same parameters.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The PPG.
+    sfreq : float
+        Sampling rate of the PPG.
+    peakwindow, beatwindow, beatoffset, mindelay : list
+        The values of each parameter (see ppg_peaks).
+    annotation : ndarray, optional
+        Reference systolic peaks (samples). If supplied, the peaks of each
+        parameter set are scored against the annotation.
+    tolerance : float, optional
+        Maximum distance in seconds between a peak and an annotated peak to
+        count as a match, by default .05.
+
+    Returns
+    -------
+    results : list of dict
+        One dictionary per parameter set, containing the parameter values,
+        the "peaks", and (if an annotation is supplied) the "sensitivity"
+        and "precision".
+    """
+    tuner = PpgTuner(signal, sfreq)
+    grid = {"peakwindow": peakwindow,
+            "beatwindow": beatwindow,
+            "beatoffset": beatoffset,
+            "mindelay": mindelay}
+
+    return _sweep(tuner, grid, annotation, tolerance)
+
+
+def _sweep(tuner, grid, annotation, tolerance):
+    """Peaks of the tuner for every combination of the parameter values in
+    grid, with the last parameter changing fastest."""
+    results = []
+    for values in product(*grid.values()):
+        params = dict(zip(grid, values))
+        result = {**params, "peaks": tuner.peaks(**params)}
+        if annotation is not None:
+            result.update(_score_peaks(result["peaks"], annotation,
+                                       int(np.rint(tolerance *
+                                                   tuner.sfreq))))
+        results.append(result)
+
+    return results
+
+
+class _PeakTuner:
+    """Shared machinery of the detector tuners. Each stage is memoized for
+    the most recent value of the parameters it depends on, such that
+    changing one parameter only re-computes the stages downstream of that
+    parameter."""
+
+    def __init__(self, signal, sfreq):
+        self.signal = signal
+        self.sfreq = sfreq
+        self._memos = {}
+
+    def _memo(self, stage, key, compute):
+        memo = self._memos.get(stage)
+        if memo is None or memo[0] != key:
+            memo = (key, compute())
+            self._memos[stage] = memo
+        return memo[1]
+
+    def _select(self, begs, ends, mindelay, window):
+        """Most prominent local maximum within each window (e.g., QRS
+        complex), restricted to the peaks within the range of samples
+        window = (beg, end), with minimum delay between peaks. Within the
+        range, the first peak is not subject to the minimum delay."""
+        mindelay = int(np.rint(mindelay * self.sfreq))
+        offset = 0
+        if window is not None:
+            overlap = (ends > window[0]) & (begs < window[1])
+            begs = begs[overlap]
+            ends = ends[overlap]
+            offset = window[0] - mindelay - 1
+        peaks = _window_peaks(self.signal, begs, ends)
+        if window is not None:
+            peaks = peaks[(peaks >= window[0]) & (peaks < window[1])]
+
+        return _enforce_mindelay(peaks - offset, mindelay) + offset
+
+    def _peaks(self, key, begs, ends, keep, mindelay, window):
+        """Peaks in the windows (begs, ends) that are kept. Without window,
+        the most prominent local maximum of each window is memoized under
+        key, since it does not depend on the other windows."""
+        if window is not None:
+            return self._select(begs[keep], ends[keep], mindelay, window)
+
+        def candidates():
+            peaks = _window_peaks(self.signal, begs, ends)
+            return peaks, np.searchsorted(begs, peaks, side="right") - 1
+
+        peaks, windows = self._memo("candidates", key, candidates)
+
+        return _enforce_mindelay(peaks[keep[windows]],
+                                 int(np.rint(mindelay * self.sfreq)))
+
+
+class EcgTuner(_PeakTuner):
+    """Re-detect R-peaks with different parameters of ecg_peaks at the cost of
+    the threshold and selection stages. The filtered gradient of the signal is
+    computed once, the smoothed gradient and the threshold are re-used as long
+    as smoothwindow and avgwindow do not change, and the QRS complexes as long
+    as gradthreshweight does not change in addition.
+
+    Examples
+    --------
+    >>> tuner = EcgTuner(signal, sfreq)
+    >>> peaks = tuner.peaks(gradthreshweight=1.2)
+    >>> peaks = tuner.peaks(gradthreshweight=1.3)    # fast
+    """
 
+    def __init__(self, signal, sfreq, powerlinefreq=None):
+        super().__init__(signal, sfreq)
+        _, self._absgrad = _ecg_gradient(signal, sfreq, powerlinefreq)
+
+    def peaks(self, smoothwindow=.1, avgwindow=.75, gradthreshweight=1.5,
+              minlenweight=0.4, mindelay=.3, window=None):
+        """
+        Parameters
+        ----------
+        smoothwindow, avgwindow, gradthreshweight, minlenweight, mindelay : float
+            See ecg_peaks.
+        window : tuple of int, optional
+            Range of samples (beg, end). If supplied, only the peaks within the
+            range are detected (e.g., for a fast preview of the visible part of
+            the signal). The minimal QRS length is still based on all QRS
+            complexes.
+
+        Returns
+        -------
+        peaks : ndarray
+            The R-peaks. Without window, identical to the R-peaks returned by
+            ecg_peaks with the same parameters.
+        """
+        smoothsize = _window_size(smoothwindow, self.sfreq)
+        avgsize = _window_size(avgwindow, self.sfreq)
+        smoothgrad = self._memo("smoothgrad", smoothsize,
+                                lambda: moving_average(self._absgrad,
+                                                       smoothsize))
+        avggrad = self._memo("avggrad", (smoothsize, avgsize),
+                             lambda: moving_average(smoothgrad, avgsize))
+        key = (smoothsize, avgsize, gradthreshweight)
+        beg_qrs, end_qrs = self._memo("qrs", key,
+                                      lambda: _window_bounds(smoothgrad >
+                                                             gradthreshweight *
+                                                             avggrad))
+        keep = _long_qrs(end_qrs - beg_qrs, minlenweight)
+
+        return self._peaks(key, beg_qrs, end_qrs, keep, mindelay, window)
+
+
+class PpgTuner(_PeakTuner):
+    """Re-detect systolic peaks with different parameters of ppg_peaks at the
+    cost of the threshold and selection stages. The filtered signal is
+    computed once, and the moving averages are re-used as long as peakwindow
+    and beatwindow do not change, respectively.
+
+    Examples
+    --------
+    >>> tuner = PpgTuner(signal, sfreq)
+    >>> peaks = tuner.peaks(beatoffset=.01)
+    >>> peaks = tuner.peaks(beatoffset=.03)    # fast
+    """
 
-def heart_period(peaks, sfreq, nsamp):
+    def __init__(self, signal, sfreq):
+        super().__init__(signal, sfreq)
+        _, self._sqrd = _ppg_energy(signal, sfreq)
+        self._meansqrd = np.mean(self._sqrd)
+
+    def peaks(self, peakwindow=.111, beatwindow=.667, beatoffset=.02,
+              mindelay=.3, window=None):
+        """
+        Parameters
+        ----------
+        peakwindow, beatwindow, beatoffset, mindelay : float
+            See ppg_peaks.
+        window : tuple of int, optional
+            Range of samples (beg, end). If supplied, only the peaks within the
+            range are detected (e.g., for a fast preview of the visible part of
+            the signal).
+
+        Returns
+        -------
+        peaks : ndarray
+            The systolic peaks. Without window, identical to the systolic
+            peaks returned by ppg_peaks with the same parameters.
+        """
+        peaksize = _window_size(peakwindow, self.sfreq)
+        beatsize = _window_size(beatwindow, self.sfreq)
+        ma_peak = self._memo("ma_peak", peaksize,
+                             lambda: moving_average(self._sqrd, peaksize))
+        ma_beat = self._memo("ma_beat", beatsize,
+                             lambda: moving_average(self._sqrd, beatsize))
+        key = (peaksize, beatsize, beatoffset)
+        beg_waves, end_waves = self._memo("waves", key,
+                                          lambda: _window_bounds(ma_peak >
+                                                                 ma_beat +
+                                                                 beatoffset *
+                                                                 self._meansqrd))
+        keep = end_waves - beg_waves >= peaksize
+
+        return self._peaks(key, beg_waves, end_waves, keep, mindelay, window)
+
+
+def _score_peaks(peaks, annotation, tolerance):
+    """Sensitivity and precision of peaks with respect to the annotation. An
+    annotated peak is detected if its closest peak is within tolerance
+    samples (each peak is matched to at most one annotated peak)."""
+    annotation = np.asarray(annotation)
+    if not peaks.size or not annotation.size:
+        return {"sensitivity": 0., "precision": 0.}
+    right = np.minimum(np.searchsorted(peaks, annotation), peaks.size - 1)
+    left = np.maximum(right - 1, 0)
+    idcs = np.where(np.abs(peaks[left] - annotation) <=
+                    np.abs(peaks[right] - annotation), left, right)
+    matched = np.abs(peaks[idcs] - annotation) <= tolerance
+    n_matched = np.unique(idcs[matched]).size
+
+    return {"sensitivity": n_matched / annotation.size,
+            "precision": n_matched / peaks.size}
+
+
+def heart_period(peaks, sfreq, nsamp, dtype=np.float64):
 
     # Compute normal-to-normal intervals.
     rr = np.ediff1d(peaks, to_begin=0) / sfreq
     rr[0] = np.mean(rr[1:])
 
     # Interpolate rr at the signals sampling rate for plotting.
-    periodintp = interp_stats(peaks, rr, nsamp)
+    periodintp = interp_stats(peaks, rr, nsamp, dtype=dtype)
     rateintp = 60 / periodintp
 
     return periodintp, rateintp
 
 
-def correct_peaks(peaks, sfreq, iterative=True):
+def correct_peaks(peaks, sfreq, iterative=True, usable=None):
+    """
+    usable is an optional boolean mask of the signal that is False for
+    unusable parts of the signal (see analysis_utils.signal_quality). The
+    peaks in each stretch of usable signal are corrected separately, such
+    that the gaps at unusable parts are not mistaken for missed peaks.
+    Stretches of less than three peaks are left as they are.
+
+    If iterative is True, the artifacts are re-classified after each
+    correction, but only in the neighbourhood of the beats that the
+    correction changed (see _ArtifactTracker).
+    """
+    if usable is not None:
+        n_unusable = np.concatenate(([0], np.cumsum(np.logical_not(usable))))
+        gaps = np.where(n_unusable[peaks[1:]] != n_unusable[peaks[:-1]])[0]
+        stretches = np.split(peaks, gaps + 1)
+        return np.concatenate([correct_peaks(stretch, sfreq, iterative)
+                               if stretch.size > 2 else stretch
+                               for stretch in stretches])
+
+    if not iterative:
+        artifacts = _find_artifacts(peaks, sfreq)
+        return _correct_artifacts(artifacts, peaks)
 
     # Get corrected peaks and normal-to-normal intervals.
-    artifacts = _find_artifacts(peaks, sfreq)
+    tracker = _ArtifactTracker(peaks, sfreq)
+    artifacts = tracker.artifacts()
     peaks_clean = _correct_artifacts(artifacts, peaks)
 
-    if iterative:
-
-        # Iteratively apply the artifact correction until the number of artifact
-        # reaches an equilibrium (i.e., the number of artifacts does not change
-        # anymore from one iteration to the next).
-        n_artifacts_previous = np.inf
-        n_artifacts_current = sum([len(i) for i in artifacts.values()])
+    # Iteratively apply the artifact correction until the number of artifact
+    # reaches an equilibrium (i.e., the number of artifacts does not change
+    # anymore from one iteration to the next).
+    n_artifacts_previous = np.inf
+    n_artifacts_current = sum([len(i) for i in artifacts.values()])
 
-        previous_diff = 0
+    previous_diff = 0
 
-        while n_artifacts_current - n_artifacts_previous != previous_diff:
+    while n_artifacts_current - n_artifacts_previous != previous_diff:
 
-            previous_diff = n_artifacts_previous - n_artifacts_current
+        previous_diff = n_artifacts_previous - n_artifacts_current
 
-            artifacts = _find_artifacts(peaks_clean, sfreq)
-            peaks_clean = _correct_artifacts(artifacts, peaks_clean)
+        tracker.update(peaks_clean)
+        artifacts = tracker.artifacts()
+        peaks_clean = _correct_artifacts(artifacts, peaks_clean)
 
-            n_artifacts_previous = n_artifacts_current
-            n_artifacts_current = sum([len(i) for i in artifacts.values()])
+        n_artifacts_previous = n_artifacts_current
+        n_artifacts_current = sum([len(i) for i in artifacts.values()])
 
     return peaks_clean
 
 
+# Free parameters of the artifact detection.
+artifactparams = {"c1": 0.13,
+                  "c2": 0.17,
+                  "alpha": 5.2,
+                  "window_width": 91,
+                  "medfilt_order": 11}
+artifacttypes = ("ectopic", "missed", "extra", "longshort")
+
+
 def _find_artifacts(peaks, sfreq, enable_plot=False):
     """
     Implementation of Jukka A. Lipponen & Mika P. Tarvainen (2019): A robust
@@ -202,15 +1216,22 @@ def _find_artifacts(peaks, sfreq, enable_plot=False):
     novel beat classification, Journal of Medical Engineering & Technology,
     DOI: 10.1080/03091902.2019.1640306
     """
-    peaks = np.ravel(peaks)
+    rr, drrs = _heart_periods(np.ravel(peaks), sfreq)
+    features = _artifact_features(rr, drrs)
+    labels, _ = _label_artifacts(rr, *features)
+    artifacts = _artifact_indices(labels)
+
+    if enable_plot:
+        drrs, mrrs, s12, s22, _, _ = features
+        _plot_artifacts(artifacts, rr, drrs, mrrs, s12, s22,
+                        artifactparams["c1"], artifactparams["c2"])
+
+    return artifacts
 
-    # Set free parameters.
-    c1 = 0.13
-    c2 = 0.17
-    alpha = 5.2
-    window_width = 91
-    medfilt_order = 11
 
+def _heart_periods(peaks, sfreq):
+    """Period series (rr) and differences of consecutive periods (dRRs) of
+    the peaks."""
     # Compute period series (make sure it has same numer of elements as peaks);
     # peaks are in samples, convert to seconds.
     rr = np.ediff1d(peaks, to_begin=0) / sfreq
@@ -218,41 +1239,38 @@ def _find_artifacts(peaks, sfreq, enable_plot=False):
     # a value in a realistic range (e.g., for median filtering).
     rr[0] = np.mean(rr[1:])
 
-    # Artifact identification #################################################
-    ###########################################################################
-
     # Compute dRRs: time series of differences of consecutive periods (dRRs).
     drrs = np.ediff1d(rr, to_begin=0)
     drrs[0] = np.mean(drrs[1:])
-    # Normalize by threshold.
-    th1 = compute_threshold(drrs, alpha, window_width)
-    drrs /= th1
 
-    # Cast dRRs to subspace s12.
-    # Pad drrs with one element.
-    padding = 2
-    drrs_pad = np.pad(drrs, padding, "reflect")
+    return rr, drrs
+
 
-    s12 = np.zeros(drrs.size)
-    for d in np.arange(padding, padding + drrs.size):
+def _artifact_features(rr, drrs):
+    """Normalized dRRs and mRRs, subspaces, median periods, and mRR
+    threshold of the periods.
 
-        if drrs_pad[d] > 0:
-            s12[d - padding] = np.max([drrs_pad[d - 1], drrs_pad[d + 1]])
-        elif drrs_pad[d] < 0:
-            s12[d - padding] = np.min([drrs_pad[d - 1], drrs_pad[d + 1]])
+    Each feature of a beat only depends on the periods within
+    window_width // 2 + medfilt_order // 2 beats of it. NaNs in rr and drrs
+    are skipped by the rolling statistics, such that separate stretches of
+    periods can be processed at once if they are separated by at least
+    window_width // 2 NaNs.
+    """
+    import pandas as pd
 
-    # Cast dRRs to subspace s22.
-    s22 = np.zeros(drrs.size)
-    for d in np.arange(padding, padding + drrs.size):
+    alpha = artifactparams["alpha"]
+    window_width = artifactparams["window_width"]
+
+    # Normalize dRRs by threshold.
+    th1 = compute_threshold(drrs, alpha, window_width)
+    drrs = drrs / th1
 
-        if drrs_pad[d] >= 0:
-            s22[d - padding] = np.min([drrs_pad[d + 1], drrs_pad[d + 2]])
-        elif drrs_pad[d] < 0:
-            s22[d - padding] = np.max([drrs_pad[d + 1], drrs_pad[d + 2]])
+    # Cast dRRs to subspaces s12 and s22.
+    s12, s22 = _subspaces(drrs)
 
     # Compute mRRs: time series of deviation of RRs from median.
     df = pd.DataFrame({'signal': rr})
-    medrr = df.rolling(medfilt_order, center=True,
+    medrr = df.rolling(artifactparams["medfilt_order"], center=True,
                        min_periods=1).median().signal.to_numpy()
     mrrs = rr - medrr
     mrrs[mrrs < 0] = mrrs[mrrs < 0] * 2
@@ -260,145 +1278,304 @@ def _find_artifacts(peaks, sfreq, enable_plot=False):
     th2 = compute_threshold(mrrs, alpha, window_width)
     mrrs /= th2
 
-    # Artifact classification #################################################
-    ###########################################################################
-
-    # Artifact classes.
-    extra_idcs = []
-    missed_idcs = []
-    ectopic_idcs = []
-    longshort_idcs = []
-
-    i = 0
-    while i < rr.size - 2:    # The flow control is implemented based on Figure 1
-
-        if np.abs(drrs[i]) <= 1:    # Figure 1
-            i += 1
-            continue
-        eq1 = np.logical_and(drrs[i] > 1, s12[i] < (-c1 * drrs[i] - c2))    # Figure 2a
-        eq2 = np.logical_and(drrs[i] < -1, s12[i] > (-c1 * drrs[i] + c2))    # Figure 2a
-
-        if np.any([eq1, eq2]):
-            # If any of the two equations is true.
-            ectopic_idcs.append(i)
-            i += 1
-            continue
-        # If none of the two equations is true.
-        if ~np.any([np.abs(drrs[i]) > 1, np.abs(mrrs[i]) > 3]):    # Figure 1
-            i += 1
-            continue
-        longshort_candidates = [i]
-        # Check if the following beat also needs to be evaluated.
-        if np.abs(drrs[i + 1]) < np.abs(drrs[i + 2]):
-            longshort_candidates.append(i + 1)
-
-        for j in longshort_candidates:
-            # Long beat.
-            eq3 = np.logical_and(drrs[j] > 1, s22[j] < -1)    # Figure 2b
-            # Long or short.
-            eq4 = np.abs(mrrs[j]) > 3    # Figure 1
-            # Short beat.
-            eq5 = np.logical_and(drrs[j] < -1, s22[j] > 1)    # Figure 2b
-
-            if ~np.any([eq3, eq4, eq5]):
-                # If none of the three equations is true: normal beat.
-                i += 1
-                continue
-            # If any of the three equations is true: check for missing or extra
-            # peaks.
-
-            # Missing.
-            eq6 = np.abs(rr[j] / 2 - medrr[j]) < th2[j]    # Figure 1
-            # Extra.
-            eq7 = np.abs(rr[j] + rr[j + 1] - medrr[j]) < th2[j]    # Figure 1
-
-            # Check if extra.
-            if np.all([eq5, eq7]):
-                extra_idcs.append(j)
-                i += 1
-                continue
-            # Check if missing.
-            if np.all([eq3, eq6]):
-                missed_idcs.append(j)
-                i += 1
-                continue
-            # If neither classified as extra or missing, classify as "long or
-            # short".
-            longshort_idcs.append(j)
-            i += 1
-
-    artifacts = {"ectopic": ectopic_idcs, "missed": missed_idcs,
-                 "extra": extra_idcs, "longshort": longshort_idcs}
+    return drrs, mrrs, s12, s22, medrr, th2
 
-    if enable_plot:
-        # Visualize artifact type indices.
-        fig0, (ax0, ax1, ax2) = plt.subplots(nrows=3, ncols=1, sharex=True)
-        ax0.set_title("Artifact types", fontweight="bold")
-        ax0.plot(rr, label="heart period")
-        ax0.scatter(longshort_idcs, rr[longshort_idcs], marker='x', c='m',
-                    s=100, zorder=3, label="longshort")
-        ax0.scatter(ectopic_idcs, rr[ectopic_idcs], marker='x', c='g', s=100,
-                    zorder=3, label="ectopic")
-        ax0.scatter(extra_idcs, rr[extra_idcs], marker='x', c='y', s=100,
-                    zorder=3, label="false positive")
-        ax0.scatter(missed_idcs, rr[missed_idcs], marker='x', c='r', s=100,
-                    zorder=3, label="false negative")
-        ax0.legend(loc="upper right")
-
-        # Visualize first threshold.
-        ax1.set_title("Consecutive-difference criterion", fontweight="bold")
-        ax1.plot(np.abs(drrs), label="difference consecutive heart periods")
-        ax1.axhline(1, c='r', label="artifact threshold")
-        ax1.legend(loc="upper right")
-
-        # Visualize second thresold.
-        ax2.set_title("Difference-from-median criterion", fontweight="bold")
-        ax2.plot(np.abs(mrrs), label="difference from median over 11 periods")
-        ax2.axhline(3, c="r", label="artifact threshold")
-        ax2.legend(loc="upper right")
-
-        # Visualize subspaces.
-        fig1, (ax3, ax4) = plt.subplots(nrows=1, ncols=2)
-        ax3.set_title("Subspace 1", fontweight="bold")
-        ax3.set_xlabel("S11")
-        ax3.set_ylabel("S12")
-        ax3.scatter(drrs, s12, marker="x", label="heart periods")
-        verts0 = [(min(drrs), max(s12)),
-                  (min(drrs), -c1 * min(drrs) + c2),
-                  (-1, -c1 * -1 + c2),
-                  (-1, max(s12))]
-        poly0 = Polygon(verts0, alpha=0.3, facecolor="r", edgecolor=None,
-                        label="ectopic periods")
-        ax3.add_patch(poly0)
-        verts1 = [(1, -c1 * 1 - c2),
-                  (1, min(s12)),
-                  (max(drrs), min(s12)),
-                  (max(drrs), -c1 * max(drrs) - c2)]
-        poly1 = Polygon(verts1, alpha=0.3, facecolor="r", edgecolor=None)
-        ax3.add_patch(poly1)
-        ax3.legend(loc="upper right")
-
-        ax4.set_title("Subspace 2", fontweight="bold")
-        ax4.set_xlabel("S21")
-        ax4.set_ylabel("S22")
-        ax4.scatter(drrs, s22, marker="x", label="heart periods")
-        verts2 = [(min(drrs), max(s22)),
-                  (min(drrs), 1),
-                  (-1, 1),
-                  (-1, max(s22))]
-        poly2 = Polygon(verts2, alpha=0.3, facecolor="r", edgecolor=None,
-                        label="short periods")
-        ax4.add_patch(poly2)
-        verts3 = [(1, -1),
-                  (1, min(s22)),
-                  (max(drrs), min(s22)),
-                  (max(drrs), -1)]
-        poly3 = Polygon(verts3, alpha=0.3, facecolor="y", edgecolor=None,
-                        label="long periods")
-        ax4.add_patch(poly3)
-        ax4.legend(loc="upper right")
 
-    return artifacts
+def _artifact_indices(labels):
+    """Indices of the beats in each artifact class (see _label_artifacts)."""
+    return {name: np.flatnonzero(labels == i).tolist()
+            for i, name in enumerate(artifacttypes, 1)}
+
+
+def _label_artifacts(rr, drrs, mrrs, s12, s22, medrr, th2,
+                     c1=artifactparams["c1"], c2=artifactparams["c2"]):
+    """Classify the beats according to Figures 1 and 2 in Lipponen & Tarvainen
+    (2019), with the equations evaluated for all beats at once.
+
+    The beats are scanned from left to right. A beat that exceeds the dRR
+    threshold and is not ectopic is a candidate for a long or short beat. If
+    the following beat is a candidate as well (its dRR is smaller than the
+    dRR of the beat after it), both are classified and the scan skips the
+    following beat.
+
+    Returns
+    -------
+    labels : array
+        Artifact class of each beat: 0 for normal beats, otherwise one plus
+        the index of the class in artifacttypes.
+    paired : array
+        Whether each beat that the scan can start at (all beats but the last
+        two) is paired with the following beat. The pairing of a beat only
+        depends on the dRRs, mRRs and s12 of the beat and the two following
+        beats.
+    """
+    n = max(rr.size - 2, 0)    # number of beats at which the scan can start
+    absdrrs = np.abs(drrs)
+    absmrrs = np.abs(mrrs)
+
+    # Figure 1 and Figure 2a.
+    exceeds = ~(absdrrs[:n] <= 1)
+    eq1 = (drrs[:n] > 1) & (s12[:n] < -c1 * drrs[:n] - c2)
+    eq2 = (drrs[:n] < -1) & (s12[:n] > -c1 * drrs[:n] + c2)
+    ectopic = exceeds & (eq1 | eq2)
+    candidate = (exceeds & ~ectopic &
+                 ((absdrrs[:n] > 1) | (absmrrs[:n] > 3)))
+    paired = candidate & (absdrrs[1:n + 1] < absdrrs[2:n + 2])
+
+    # A beat is skipped by the scan if its predecessor is visited and paired.
+    # Within a run of consecutive paired predecessors, visited and skipped
+    # beats alternate, starting with a visited beat.
+    pairedprevious = np.zeros(n, dtype=bool)
+    pairedprevious[1:] = paired[:-1]
+    idcs = np.arange(n)
+    runstart = np.maximum.accumulate(np.where(pairedprevious, 0, idcs))
+    visited = (idcs - runstart) % 2 == 0
+
+    # Beats that are classified as long or short candidates: the visited
+    # candidates and their paired successors.
+    evaluated = np.zeros(n + 1, dtype=bool)
+    evaluated[:n] = visited & candidate
+    evaluated[1:] |= visited & paired
+
+    # Figure 1 and Figure 2b.
+    j = np.flatnonzero(evaluated)
+    eq3 = (drrs[j] > 1) & (s22[j] < -1)    # long beat
+    eq4 = absmrrs[j] > 3    # long or short
+    eq5 = (drrs[j] < -1) & (s22[j] > 1)    # short beat
+    eq6 = np.abs(rr[j] / 2 - medrr[j]) < th2[j]    # missing
+    eq7 = np.abs(rr[j] + rr[j + 1] - medrr[j]) < th2[j]    # extra
+    abnormal = eq3 | eq4 | eq5
+    extra = abnormal & eq5 & eq7
+    missed = abnormal & ~extra & eq3 & eq6
+    longshort = abnormal & ~extra & ~missed
+
+    labels = np.zeros(rr.size, dtype=np.int8)
+    labels[:n][visited & ectopic] = 1
+    labels[j[missed]] = 2
+    labels[j[extra]] = 3
+    labels[j[longshort]] = 4
+
+    return labels, paired
+
+
+class _ArtifactTracker:
+    """Artifact classification of peaks that are corrected repeatedly.
+
+    The features and the classification of a beat only depend on the periods
+    in its neighbourhood (except for the pairing of long and short beats,
+    which propagates along runs of paired beats). After each correction, they
+    are only re-computed around the beats whose periods changed, and taken
+    over from the previous peaks everywhere else.
+    """
+
+    def __init__(self, peaks, sfreq):
+        self.sfreq = sfreq
+        self.peaks = np.ravel(peaks)
+        self.rr, self.drrs = _heart_periods(self.peaks, sfreq)
+        self.features = np.vstack(_artifact_features(self.rr, self.drrs))
+        self.labels, _ = _label_artifacts(self.rr, *self.features)
+        self.reach = (artifactparams["window_width"] // 2 +
+                      artifactparams["medfilt_order"] // 2)
+
+    def artifacts(self):
+        return _artifact_indices(self.labels)
+
+    def update(self, peaks):
+        """Update the classification to peaks, e.g., the previous peaks
+        corrected for artifacts."""
+        # Match each beat to the previous beat at the same sample, and take
+        # over the state of the matched beats.
+        previous = self.peaks
+        self.peaks = np.ravel(peaks)
+        origin = np.minimum(np.searchsorted(previous, self.peaks),
+                            previous.size - 1)
+        rr, drrs, features, labels = (x[..., origin] for x in
+                                      (self.rr, self.drrs, self.features,
+                                       self.labels))
+
+        # The state of a beat is valid if all beats in its neighbourhood are
+        # matched to consecutive previous beats, with the same periods and
+        # dRRs (the period of the first beat is the mean period, such that it
+        # changes with any other period). Beats that are unmatched (added or
+        # misaligned beats), that follow a gap in the matching (e.g., deleted
+        # beats), or whose periods changed, invalidate their neighbourhood.
+        self.rr, self.drrs = _heart_periods(self.peaks, self.sfreq)
+        changed = previous[origin] != self.peaks
+        changed[1:] |= np.diff(origin) != 1
+        changed[0] |= origin[0] != 0
+        changed[-1] |= origin[-1] != previous.size - 1
+        changed |= _differs(self.rr, rr) | _differs(self.drrs, drrs)
+
+        self.features = features
+        self.labels = labels
+        for beg, end in self._regions(np.flatnonzero(changed)):
+            self._relabel(beg, end)
+
+    def _regions(self, changed):
+        """Re-compute the features of the beats within reach of the changed
+        beats, and return the merged ranges of re-computed beats."""
+        if not changed.size:
+            return []
+        n = self.peaks.size
+        begs = np.maximum(changed - self.reach, 0)
+        ends = np.minimum(changed + self.reach + 1, n)
+        # Merge ranges whose context (reach beats on either side) overlaps.
+        merge = begs[1:] <= ends[:-1] + 2 * self.reach
+        begs = begs[np.concatenate(([True], ~merge))]
+        ends = ends[np.concatenate((~merge, [True]))]
+
+        # Compute the features of all ranges at once, with their context
+        # separated by NaNs.
+        separator = np.full(artifactparams["window_width"] // 2, np.nan)
+        lows = np.maximum(begs - self.reach, 0)
+        highs = np.minimum(ends + self.reach, n)
+
+        def join(x):
+            return np.concatenate([np.concatenate((x[low:high], separator))
+                                   for low, high in zip(lows, highs)])
+
+        features = np.vstack(_artifact_features(join(self.rr),
+                                                join(self.drrs)))
+        offset = 0
+        for beg, end, low, high in zip(begs, ends, lows, highs):
+            self.features[:, beg:end] = features[:, offset + beg - low:
+                                                 offset + end - low]
+            offset += high - low + separator.size
+
+        return zip(begs, ends)
+
+    def _relabel(self, beg, end):
+        """Re-classify the beats around the range of beats whose features
+        changed.
+
+        The classification starts at a beat that the scan visits regardless of
+        the preceding beats (i.e., whose predecessor is not paired), at least
+        two beats before the range. It stops at the first beat after the range
+        whose predecessor is not paired, since the classification of the
+        following beats is the same as before.
+        """
+        n = self.peaks.size
+        margin = 8
+        while True:
+            low = max(beg - 2 - margin, 0)
+            high = min(end + 1 + margin, n)
+            labels, paired = _label_artifacts(self.rr[low:high],
+                                              *self.features[:, low:high])
+            starts = low + 1 + np.flatnonzero(~paired[:max(beg - 2 - low, 0)])
+            stops = end + 1 + np.flatnonzero(~paired[end - low:])
+            if (low == 0 or starts.size) and (high == n or stops.size):
+                break
+            margin *= 2
+
+        first = 0 if low == 0 else starts[-1]
+        last = stops[0] if stops.size else n
+        self.labels[first:last] = labels[first - low:last - low]
+
+
+def _differs(x, y):
+    """Elementwise inequality of x and y, where NaNs are equal."""
+    return (x != y) & ~(np.isnan(x) & np.isnan(y))
+
+
+def _subspaces(drrs):
+    """Subspaces s12 and s22 of the dRRs (Figure 2 in Lipponen & Tarvainen,
+    2019), computed from shifted copies of the dRRs."""
+    # Pad drrs with two elements on each side.
+    padding = 2
+    drrs_pad = np.pad(drrs, padding, "reflect")
+    n = drrs.size
+    previous = drrs_pad[padding - 1:padding - 1 + n]
+    next1 = drrs_pad[padding + 1:padding + 1 + n]
+    next2 = drrs_pad[padding + 2:padding + 2 + n]
+
+    # s12 is the larger neighbor of positive dRRs and the smaller neighbor of
+    # negative dRRs (zero otherwise).
+    s12 = np.where(drrs > 0, np.maximum(previous, next1),
+                   np.where(drrs < 0, np.minimum(previous, next1), 0.))
+    # s22 is the smaller of the two following dRRs for non-negative dRRs and
+    # the larger for negative dRRs.
+    s22 = np.where(drrs >= 0, np.minimum(next1, next2),
+                   np.where(drrs < 0, np.maximum(next1, next2), 0.))
+
+    return s12, s22
+
+
+def _plot_artifacts(artifacts, rr, drrs, mrrs, s12, s22, c1, c2):
+    """Visualize the classification of _find_artifacts."""
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Polygon
+
+    longshort_idcs = artifacts["longshort"]
+    ectopic_idcs = artifacts["ectopic"]
+    extra_idcs = artifacts["extra"]
+    missed_idcs = artifacts["missed"]
+
+    # Visualize artifact type indices.
+    fig0, (ax0, ax1, ax2) = plt.subplots(nrows=3, ncols=1, sharex=True)
+    ax0.set_title("Artifact types", fontweight="bold")
+    ax0.plot(rr, label="heart period")
+    ax0.scatter(longshort_idcs, rr[longshort_idcs], marker='x', c='m',
+                s=100, zorder=3, label="longshort")
+    ax0.scatter(ectopic_idcs, rr[ectopic_idcs], marker='x', c='g', s=100,
+                zorder=3, label="ectopic")
+    ax0.scatter(extra_idcs, rr[extra_idcs], marker='x', c='y', s=100,
+                zorder=3, label="false positive")
+    ax0.scatter(missed_idcs, rr[missed_idcs], marker='x', c='r', s=100,
+                zorder=3, label="false negative")
+    ax0.legend(loc="upper right")
+
+    # Visualize first threshold.
+    ax1.set_title("Consecutive-difference criterion", fontweight="bold")
+    ax1.plot(np.abs(drrs), label="difference consecutive heart periods")
+    ax1.axhline(1, c='r', label="artifact threshold")
+    ax1.legend(loc="upper right")
+
+    # Visualize second thresold.
+    ax2.set_title("Difference-from-median criterion", fontweight="bold")
+    ax2.plot(np.abs(mrrs), label="difference from median over 11 periods")
+    ax2.axhline(3, c="r", label="artifact threshold")
+    ax2.legend(loc="upper right")
+
+    # Visualize subspaces.
+    fig1, (ax3, ax4) = plt.subplots(nrows=1, ncols=2)
+    ax3.set_title("Subspace 1", fontweight="bold")
+    ax3.set_xlabel("S11")
+    ax3.set_ylabel("S12")
+    ax3.scatter(drrs, s12, marker="x", label="heart periods")
+    verts0 = [(min(drrs), max(s12)),
+              (min(drrs), -c1 * min(drrs) + c2),
+              (-1, -c1 * -1 + c2),
+              (-1, max(s12))]
+    poly0 = Polygon(verts0, alpha=0.3, facecolor="r", edgecolor=None,
+                    label="ectopic periods")
+    ax3.add_patch(poly0)
+    verts1 = [(1, -c1 * 1 - c2),
+              (1, min(s12)),
+              (max(drrs), min(s12)),
+              (max(drrs), -c1 * max(drrs) - c2)]
+    poly1 = Polygon(verts1, alpha=0.3, facecolor="r", edgecolor=None)
+    ax3.add_patch(poly1)
+    ax3.legend(loc="upper right")
+
+    ax4.set_title("Subspace 2", fontweight="bold")
+    ax4.set_xlabel("S21")
+    ax4.set_ylabel("S22")
+    ax4.scatter(drrs, s22, marker="x", label="heart periods")
+    verts2 = [(min(drrs), max(s22)),
+              (min(drrs), 1),
+              (-1, 1),
+              (-1, max(s22))]
+    poly2 = Polygon(verts2, alpha=0.3, facecolor="r", edgecolor=None,
+                    label="short periods")
+    ax4.add_patch(poly2)
+    verts3 = [(1, -1),
+              (1, min(s22)),
+              (max(drrs), min(s22)),
+              (max(drrs), -1)]
+    poly3 = Polygon(verts3, alpha=0.3, facecolor="y", edgecolor=None,
+                    label="long periods")
+    ax4.add_patch(poly3)
+    ax4.legend(loc="upper right")
 
 
 def _correct_artifacts(artifacts, peaks):
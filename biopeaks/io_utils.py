@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import json
-import pandas as pd
 import numpy as np
 from itertools import islice
 from struct import pack
@@ -9,6 +8,7 @@ from pathlib import Path
 
 
 def read_custom(rpath, customheader, channeltype):
+    import pandas as pd
 
     # Prepare output.
     output = {"error": False,
@@ -51,6 +51,8 @@ def write_custom(rpath, wpath, segment, customheader):
     segment : list
     Start and end of segments in seconds.
     """
+    import pandas as pd
+
     # Get the header.
     with open(rpath, "rt") as oldfile:
         header = [line for line in islice(oldfile, customheader["skiprows"])]
@@ -71,6 +73,7 @@ def write_custom(rpath, wpath, segment, customheader):
 
 
 def read_opensignals(rpath, channel, channeltype):
+    import pandas as pd
 
     # Prepare output.
     output = {"error": False,
@@ -134,6 +137,8 @@ def write_opensignals(rpath, wpath, segment, sfreq):
     segment : list
     Start and end of segments in seconds.
     """
+    import pandas as pd
+
     # Get the header.
     with open(rpath, "rt") as oldfile:
         header = [line for line in islice(oldfile, 3)]
@@ -169,7 +174,7 @@ def read_edf(rpath, channel, channeltype):
         output["error"] = "Error: File is not in EDF format."
         return output
 
-    chanidx = int(channel[1])
+    chanidx = int(channel[1:])
 
     with open(rpath, "rb") as f:
         info, _ = _read_edfheader(f)
@@ -197,6 +202,58 @@ def read_edf(rpath, channel, channeltype):
     return output
 
 
+def read_edf_channels(rpath, channels=None):
+    """Read several channels of an EDF file, parsing the file only once.
+
+    Parameters
+    ----------
+    rpath : str or Path
+        Path of the EDF file.
+    channels : list of str, optional
+        Channels in the format of read_edf (e.g., ["A1", "A3"]), by default
+        None (all channels).
+
+    Returns
+    -------
+    output : dict
+        "signals" and "sfreqs" map each channel to its signal and sampling
+        rate respectively. "error" is False or an error message.
+    """
+    output = {"error": False,
+              "signals": None,
+              "sfreqs": None}
+
+    file_extension = Path(rpath).suffix
+    if file_extension != ".edf":
+        output["error"] = "Error: File is not in EDF format."
+        return output
+
+    if channels is not None and not len(channels):
+        output["error"] = "Error: No channels selected."
+        return output
+
+    with open(rpath, "rb") as f:
+        info, _ = _read_edfheader(f)
+        signal = _read_edfsignal(f, info["end_header"])
+
+    if channels is None:
+        channels = [f"A{i}" for i in range(1, info["n_channels"] + 1)]
+    # Both indices are one-based.
+    chanidcs = [int(channel[1:]) if channel[:1] == "A" and
+                channel[1:].isdigit() else 0 for channel in channels]
+    if not all(0 < chanidx <= info["n_channels"] for chanidx in chanidcs):
+        output["error"] = "Error: Signal channel not found."
+        return output
+
+    output["signals"] = {channel: _read_edfchannel(signal, info["n_samples"],
+                                                   chanidx)
+                         for channel, chanidx in zip(channels, chanidcs)}
+    output["sfreqs"] = {channel: info["sfreqs"][chanidx - 1]
+                        for channel, chanidx in zip(channels, chanidcs)}
+
+    return output
+
+
 def write_edf(rpath, wpath, segment, *args):
     """
     segment : list
@@ -339,11 +396,17 @@ def _read_edfchannel(signal, n_samples, chanidx):
     channel_offset = np.cumsum(n_samples)[chanidx - 1] - n_chansamples
     # Get the number of samples to skip from epoch to epoch.
     channel_stride = sum(n_samples)
-    # Skip from epoch to epoch and read the signal belonging to the channel.
-    epochstarts = np.arange(channel_offset, signal.size, channel_stride)
-    chansignal = [signal[i:i + n_chansamples] for i in epochstarts]
-
-    return np.ravel(chansignal)
+    # Arrange the complete epochs in rows and read the columns belonging to
+    # the channel.
+    n_epochs = signal.size // channel_stride
+    epochs = signal[:n_epochs * channel_stride].reshape(n_epochs,
+                                                        channel_stride)
+    chansignal = epochs[:, channel_offset:channel_offset + n_chansamples]
+    # Append the (possibly partial) channel samples of an incomplete last
+    # epoch.
+    lastepoch = signal[n_epochs * channel_stride + channel_offset:]
+
+    return np.concatenate((chansignal.ravel(), lastepoch[:n_chansamples]))
 
 
 def _padtrim(entry, n_bytes):
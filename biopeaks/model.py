@@ -2,7 +2,18 @@
 
 import numpy as np
 from pathlib import Path
+from inspect import signature
 from PySide2.QtCore import QObject, Signal, Slot, Property
+from .filters import align_channel
+from .heart import EcgTuner, PpgTuner
+
+
+def _tunable(tuner):
+    """Default values of the detector parameters that can be tuned (i.e., the
+    keyword arguments of tuner.peaks)."""
+    params = signature(tuner.peaks).parameters
+    return {name: param.default for name, param in params.items()
+            if param.default is not param.empty and name != "window"}
 
 
 class Model(QObject):
@@ -110,16 +121,31 @@ class Model(QObject):
     @marker.setter
     def marker(self, value):
         self._marker = value
+        self._markeraligned = None
         if value is not None and self.plotting:
-            # In case the marker channel is sampled at a different rate than
-            # signal channel (possible for EDF format), generate the seconds
-            # vector for the markers on the spot.
-            if len(value) != len(self._signal):
-                sec = np.linspace(0, len(value) / self.sfreqmarker,
-                                  len(value))
-            else:
-                sec = self._sec
-            self.marker_changed.emit([sec, value])
+            self.marker_changed.emit([self._sec, self.markeraligned])
+
+    @property
+    def markeraligned(self):
+        """The marker channel aligned to the signal channel (i.e., resampled
+        to the sampling rate of the signal channel in case the marker channel
+        is sampled at a different rate, which is possible for EDF format).
+        The alignment is computed on first access."""
+        if self._markeraligned is None and self._marker is not None:
+            self._markeraligned = align_channel(self._marker,
+                                                self.sfreqmarker, self.sfreq,
+                                                len(self._sec))
+        return self._markeraligned
+
+    @property
+    def tuner(self):
+        """Intermediate stages of the detector (see heart.EcgTuner and
+        heart.PpgTuner) for the current signal."""
+        return self._tuner
+
+    @tuner.setter
+    def tuner(self, value):
+        self._tuner = value
 
     @property
     def rpathsignal(self):
@@ -288,6 +314,16 @@ class Model(QObject):
     def set_modality(self, value):
         self._modality = value
 
+    @Property(object)
+    def detectorparams(self):
+        return self._detectorparams
+
+    @Slot(object)
+    def set_detectorparam(self, value):
+        # value is a list of [modality, name of parameter, value of parameter]
+        modality, name, param = value
+        self._detectorparams[modality][name] = param
+
     @Property(int)
     def peakseditable(self):
         return self._peakseditable
@@ -338,6 +374,8 @@ class Model(QObject):
         self._tidalampintp = None
         self._sec = None
         self._marker = None
+        self._markeraligned = None
+        self._tuner = None
         self._segment = None
         self._status = None
         self._progress = None
@@ -360,10 +398,17 @@ class Model(QObject):
         self._wdirstats = None
         self._savebatchpeaks = False
         self._correctbatchpeaks = False
-        self._savestats = {"period": False, "rate": False, "tidalamp": False}
+        self._savestats = {"period": False, "rate": False, "tidalamp": False,
+                           "usable": False}
         self._filetype = None
+        self._detectorparams = {"ECG": _tunable(EcgTuner),
+                                "PPG": _tunable(PpgTuner)}
         self._customheader = {"signalidx": None, "markeridx": None,
                               "skiprows": None, "sfreq": None, "separator": None}
+        # The signal is cast to dtype when it is loaded (e.g., np.float32 to
+        # process the signal and statistics in single precision). None keeps
+        # the dtype of the file.
+        self.dtype = None
 
     def reset(self):
         """
@@ -379,6 +424,8 @@ class Model(QObject):
         self._tidalampintp = None
         self._sec = None
         self._marker = None
+        self._markeraligned = None
+        self._tuner = None
         self._segment = None
         self._status = None
         self._progress = None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from .heart import ecg_peaks, ppg_peaks, executors
+from .resp import resp_extrema
+from .io_utils import read_edf_channels
+from .analysis_utils import signal_quality
+
+
+peakfuncs = {"ECG": ecg_peaks,
+             "PPG": ppg_peaks,
+             "RESP": resp_extrema}
+
+
+def edf_peaks(rpath, modalities, dtype=None, quality=False, n_jobs=None,
+              executor="threads"):
+    """Detect the peaks (ECG, PPG) or extrema (RESP) in several channels of an
+    EDF file.
+
+    The file is read once, and the detectors run concurrently on the
+    channels.
+
+    Parameters
+    ----------
+    rpath : str or Path
+        Path of the EDF file.
+    modalities : dict
+        Maps each channel (e.g., "A1") to its modality ("ECG", "PPG", or
+        "RESP").
+    dtype : dtype, optional
+        If not None, the signals are cast to dtype (e.g., np.float32) before
+        detection. By default None (16 bit integers as read from the file).
+    quality : bool, optional
+        If True, the unusable parts of each channel are marked (see
+        analysis_utils.signal_quality) and skipped by the ECG and PPG
+        detectors. By default False.
+    n_jobs : int, optional
+        Number of workers, by default None (number of processors).
+    executor : str, optional
+        "threads" (default) or "processes".
+
+    Returns
+    -------
+    output : dict
+        "channels" maps each channel to a dict with the "modality", "sfreq",
+        "signal", "peaks", and "usable" (mask of usable samples, None if
+        quality is False) of the channel. "error" is False or an error
+        message.
+    """
+    output = {"error": False,
+              "channels": None}
+
+    unknown = set(modalities.values()).difference(peakfuncs)
+    if unknown:
+        output["error"] = f"Error: Unknown modality {unknown.pop()}."
+        return output
+
+    data = read_edf_channels(rpath, list(modalities))
+    if data["error"]:
+        output["error"] = data["error"]
+        return output
+
+    signals = data["signals"]
+    if dtype is not None:
+        signals = {channel: signal.astype(dtype, copy=False)
+                   for channel, signal in signals.items()}
+
+    with executors[executor](max_workers=n_jobs) as pool:
+        futures = {channel: pool.submit(_detect, modality, signals[channel],
+                                        data["sfreqs"][channel], quality)
+                   for channel, modality in modalities.items()}
+        output["channels"] = {}
+        for channel, future in futures.items():
+            peaks, usable = future.result()
+            output["channels"][channel] = {"modality": modalities[channel],
+                                           "sfreq": data["sfreqs"][channel],
+                                           "signal": signals[channel],
+                                           "peaks": peaks,
+                                           "usable": usable}
+
+    return output
+
+
+def _detect(modality, signal, sfreq, quality):
+    """Run the detector of the modality, skipping unusable parts of the signal
+    if quality is True (resp_extrema does not skip any part)."""
+    if not quality:
+        return peakfuncs[modality](signal, sfreq), None
+    usable = signal_quality(signal, sfreq)
+    if modality == "RESP":
+        return peakfuncs[modality](signal, sfreq), usable
+
+    return peakfuncs[modality](signal, sfreq, usable=usable), usable
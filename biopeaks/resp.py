@@ -2,7 +2,7 @@
 
 import numpy as np
 from itertools import cycle
-from .filters import butter_bandpass_filter
+from .filters import butter_bandpass_filter, float_dtype
 from .analysis_utils import interp_stats
 
 
@@ -64,8 +64,11 @@ def resp_extrema(signal, sfreq):
 def resp_stats(extrema, signal, sfreq):
     '''
     tidal amplitude is calculated as vertical trough-peak differences;
-    breathing period is calculated as horizontal peak-peak differences
+    breathing period is calculated as horizontal peak-peak differences;
+    the statistics have the floating point dtype of the signal (see
+    filters.float_dtype)
     '''
+    dtype = float_dtype(signal)
     # check if the alternation of peaks and troughs is
     # unbroken (it might be due to user edits);
     # if alternation of sign in extdiffs is broken, remove
@@ -125,13 +128,13 @@ def resp_stats(extrema, signal, sfreq):
     peaks = np.delete(peaks, nan_idcs)
     # to each peak, assign the vertical difference of that peak to the
     # preceding trough
-    tidalampintp = interp_stats(peaks, tidalamps, signal.size)
+    tidalampintp = interp_stats(peaks, tidalamps, signal.size, dtype=dtype)
 
     # calculate breathing period and rate
     # to each peak assign the horizontal difference to the preceding peak
     period = np.ediff1d(peaks, to_begin=0) / sfreq
     period[0] = np.mean(period[1:])
-    periodintp = interp_stats(peaks, period, signal.size)
+    periodintp = interp_stats(peaks, period, signal.size, dtype=dtype)
     rateintp = 60 / periodintp
 
     return periodintp, rateintp, tidalampintp
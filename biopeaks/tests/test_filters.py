@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor
+from scipy.signal import filtfilt, resample_poly, butter
+from biopeaks.filters import (FilterBank, butter_highpass,
+                              butter_highpass_filter, butter_bandpass,
+                              butter_bandpass_filter, HighpassStream,
+                              BandpassStream, MovingAverageStream,
+                              PowerlineStream, moving_average,
+                              moving_averages, powerline_filter,
+                              detect_powerline, align_channel)
+
+
+@pytest.fixture
+def sfreq():
+    return 1000
+
+
+@pytest.fixture
+def signal(sfreq):
+    # Simulate one minute of a 1 Hz oscillation with a slow drift and
+    # broadband noise.
+    rng = np.random.default_rng(42)
+    sec = np.arange(0, 60, 1 / sfreq)
+    signal = (np.sin(2 * np.pi * sec) + .5 * np.sin(2 * np.pi * .02 * sec) +
+              rng.normal(0, .1, sec.size))
+    return signal
+
+
+def test_filterbank_cache():
+
+    bank = FilterBank(maxsize=2)
+    sos0 = bank.sos("high", .5, 1000, 5)
+    assert bank.sos("high", .5, 1000, 5) is sos0    # re-use design
+    bank.sos("low", 10, 1000, 5)
+    bank.sos("band", [.5, 8], 1000, 3)    # evicts least recently used design
+    assert len(bank) == 2
+    assert bank.sos("high", .5, 1000, 5) is not sos0
+
+
+def test_filterbank_threads():
+
+    # Threads that share a bank whose cache is full must not evict designs
+    # from under each other.
+    bank = FilterBank(maxsize=2)
+    cutoffs = np.linspace(.1, 2, 40)
+
+    def design(i):
+        return bank.sos("high", cutoffs[i % cutoffs.size], 1000, 5)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        designs = list(pool.map(design, range(4000)))
+
+    assert len(bank) == 2
+    for i, sos in enumerate(designs[:cutoffs.size]):
+        assert np.allclose(sos, butter(5, cutoffs[i] / 500, btype="high",
+                                       output="sos"))
+
+
+def test_highpass_sos(signal, sfreq):
+
+    b, a = butter_highpass(.5, sfreq)
+    filt_ba = filtfilt(b, a, signal, method="pad")
+    filt_sos = butter_highpass_filter(signal, .5, sfreq)
+
+    assert np.allclose(filt_ba, filt_sos, atol=1e-2)
+
+
+def test_bandpass_sos(signal, sfreq):
+
+    b, a = butter_bandpass(.5, 8, sfreq, order=3)
+    filt_ba = filtfilt(b, a, signal, method="pad")
+    filt_sos = butter_bandpass_filter(signal, .5, 8, sfreq, order=3)
+
+    assert np.allclose(filt_ba, filt_sos, atol=1e-2)
+
+
+@pytest.mark.parametrize("streamfilter",
+                         [lambda sfreq: HighpassStream(.5, sfreq),
+                          lambda sfreq: BandpassStream(.5, 8, sfreq, order=3),
+                          lambda sfreq: MovingAverageStream(100),
+                          PowerlineStream])
+def test_stream_chunks(signal, sfreq, streamfilter):
+
+    # Filtering in chunks of varying size must give the same result as
+    # filtering the entire signal at once.
+    filt_whole = streamfilter(sfreq).push(signal)
+
+    stream = streamfilter(sfreq)
+    chunks = np.array_split(signal, [1, 7, 500, 10000, 10001, 33333])
+    filt_chunked = np.concatenate([stream.push(chunk) for chunk in chunks])
+
+    assert filt_chunked.size == signal.size
+    assert np.allclose(filt_whole, filt_chunked)
+
+
+@pytest.mark.parametrize("window_size", [1, 2, 75, 100, 750, 60000, 60001])
+def test_moving_average(signal, window_size):
+
+    avg_convolve = np.convolve(signal, np.ones((window_size,)) / window_size,
+                               mode="same")
+    avg_cumsum = moving_average(signal, window_size)
+
+    assert avg_convolve.shape == avg_cumsum.shape
+    assert np.allclose(avg_convolve, avg_cumsum)
+
+
+def test_moving_averages_out(signal):
+
+    window_sizes = [111, 667]
+    out = [np.empty(signal.size), np.empty(signal.size)]
+    avgs = moving_averages(signal, window_sizes, out=out)
+
+    for avg, buffer, window_size in zip(avgs, out, window_sizes):
+        assert avg is buffer
+        assert np.allclose(avg, moving_average(signal, window_size))
+
+    # Windows longer than the signal result in a longer moving average.
+    with pytest.raises(ValueError):
+        moving_average(signal[:100], 101, out=np.empty(100))
+
+
+@pytest.mark.parametrize("filterfunc",
+                         [lambda x, sfreq, axis: butter_highpass_filter(x, .5, sfreq, axis=axis),
+                          lambda x, sfreq, axis: butter_bandpass_filter(x, .5, 8, sfreq, order=3, axis=axis),
+                          lambda x, sfreq, axis: powerline_filter(x, sfreq, axis=axis),
+                          lambda x, sfreq, axis: moving_average(x, 100, axis=axis),
+                          lambda x, sfreq, axis: moving_average(x, 60001, axis=axis)])
+def test_multichannel(signal, sfreq, filterfunc):
+
+    channels = np.vstack((signal, -signal, signal ** 2))
+    filt_loop = np.vstack([filterfunc(channel, sfreq, -1)
+                           for channel in channels])
+
+    assert np.allclose(filterfunc(channels, sfreq, 1), filt_loop)
+    assert np.allclose(filterfunc(channels.T, sfreq, 0), filt_loop.T)
+
+
+@pytest.mark.parametrize("btype, cutoff, order", [("high", .5, 5),
+                                                  ("band", [.5, 8], 3),
+                                                  ("low", 10, 5)])
+def test_fft_engine(signal, sfreq, btype, cutoff, order):
+
+    bank = FilterBank()
+    filt_filtfilt = bank.filtfilt(signal, btype, cutoff, sfreq, order,
+                                  engine="filtfilt")
+    filt_fft = bank.filtfilt(signal, btype, cutoff, sfreq, order,
+                             engine="fft")
+
+    # The engines handle the signal edges differently. Away from the edges,
+    # the deviation must be smaller than 1e-4 for a signal with amplitude
+    # in the order of 1.
+    edge = 15 * sfreq
+    assert filt_fft.shape == filt_filtfilt.shape
+    assert np.allclose(filt_fft[edge:-edge], filt_filtfilt[edge:-edge],
+                       rtol=0, atol=1e-4)
+
+    bank.fft_threshold = signal.size - 1
+    assert np.array_equal(bank.filtfilt(signal, btype, cutoff, sfreq, order),
+                          filt_fft)
+
+
+def test_chunked_memmap(tmpdir, signal, sfreq):
+
+    # Write the signal to disk and filter the memory-mapped signal in blocks
+    # of 5 seconds into a memory-mapped output.
+    data = np.memmap(str(tmpdir.join("signal.dat")), dtype=np.float32, mode="w+",
+                     shape=signal.shape)
+    data[:] = signal
+    out = np.memmap(str(tmpdir.join("filtered.dat")), dtype=np.float64,
+                    mode="w+", shape=signal.shape)
+
+    bank = FilterBank()
+    filt_chunked = bank.filtfilt_chunked(data, "high", .5, sfreq, out=out,
+                                         blocksize=5 * sfreq)
+    filt_whole = bank.filtfilt(np.asarray(data), "high", .5, sfreq)
+
+    assert filt_chunked is out
+    assert np.allclose(filt_chunked, filt_whole, rtol=0, atol=1e-4)
+
+
+@pytest.mark.parametrize("freq", [50, 60])
+def test_powerline_notch(signal, sfreq, freq):
+
+    sec = np.arange(signal.size) / sfreq
+    noise = np.sin(2 * np.pi * freq * sec) + .5 * np.sin(2 * np.pi * 3 * freq * sec)
+    filt_clean = powerline_filter(signal, sfreq, freq=freq)
+    filt_noisy = powerline_filter(signal + noise, sfreq, freq="auto")
+
+    assert detect_powerline(signal + noise, sfreq) == freq
+    # The notch comb removes the power-line noise (and its harmonics) but
+    # leaves the rest of the signal intact.
+    assert np.allclose(filt_noisy[sfreq:-sfreq], filt_clean[sfreq:-sfreq],
+                       atol=.01)
+    assert np.allclose(filt_clean[sfreq:-sfreq], signal[sfreq:-sfreq],
+                       atol=.1)
+
+
+@pytest.mark.parametrize("filterfunc",
+                         [lambda x, sfreq: butter_highpass_filter(x, .5, sfreq),
+                          lambda x, sfreq: butter_bandpass_filter(x, .5, 8, sfreq, order=3),
+                          lambda x, sfreq: powerline_filter(x, sfreq),
+                          lambda x, sfreq: powerline_filter(x, sfreq, freq=50),
+                          lambda x, sfreq: moving_average(x, 100),
+                          lambda x, sfreq: HighpassStream(.5, sfreq).push(x),
+                          lambda x, sfreq: MovingAverageStream(100).push(x)])
+def test_dtype_policy(signal, sfreq, filterfunc):
+
+    filt64 = filterfunc(signal, sfreq)
+    filt32 = filterfunc(signal.astype(np.float32), sfreq)
+    filt16 = filterfunc((signal * 1000).astype(np.int16), sfreq)
+
+    assert filt64.dtype == np.float64
+    assert filt32.dtype == np.float32
+    assert filt16.dtype == np.float64
+    assert np.allclose(filt32, filt64, atol=1e-4)
+
+
+@pytest.mark.parametrize("target_sfreq", [50, 250, 1000, 1500])
+def test_resample(signal, sfreq, target_sfreq):
+
+    bank = FilterBank()
+    resampled = bank.resample(signal, sfreq, target_sfreq)
+    n_designs = len(bank)
+    ratio = Fraction(target_sfreq, sfreq)
+
+    assert np.array_equal(resampled, resample_poly(signal, ratio.numerator,
+                                                   ratio.denominator))
+    bank.resample(signal[:1000], sfreq, target_sfreq)    # re-use design
+    assert len(bank) == n_designs
+
+    # Align to a channel that is one sample longer than the resampled signal.
+    nsamp = resampled.size + 1
+    aligned = align_channel(signal, sfreq, target_sfreq, nsamp)
+    assert aligned.size == nsamp
+    assert aligned[-1] == aligned[-2]
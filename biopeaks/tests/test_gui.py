@@ -30,6 +30,8 @@ from PySide2.QtCore import Qt
 from biopeaks.model import Model
 from biopeaks.view import View
 from biopeaks.controller import Controller
+from biopeaks.heart import ecg_peaks, EcgTuner
+from biopeaks.analysis_utils import signal_quality
 
 
 class MockKeyEvent(object):
@@ -359,6 +361,83 @@ def test_singlefile(qtbot, tmpdir, cfg_single):
                          4) == cfg_single["avgtidalamp"]
 
 
+
+ecg_tuning = {"modality": "ECG",
+              "sigchan": "A3",
+              "filetype": "OpenSignals",
+              "sigpath": datadir.joinpath("OSmontage1J.txt"),
+              "segment": [60, 120]}
+
+
+def test_detector_tuning(qtbot):
+
+    # Set up application.
+    model = Model()
+    controller = Controller(model)
+    view = View(model, controller)
+    qtbot.addWidget(view)
+    view.show()
+
+    qtbot.keyClicks(view.sigchanmenu, ecg_tuning["sigchan"])
+    qtbot.keyClicks(view.modmenu, ecg_tuning["modality"])
+    model.set_filetype(ecg_tuning["filetype"])
+    assert view.tuningpanels["ECG"].isVisible()
+    assert not view.tuningpanels["PPG"].isVisible()
+
+    model.fpaths = [ecg_tuning["sigpath"]]
+    with qtbot.waitSignal(model.signal_changed, timeout=10000):
+        controller.read_channels()
+    # The detection uses the parameters of the detector.
+    model.set_detectorparam(["ECG", "mindelay", .35])
+    with qtbot.waitSignal(model.peaks_changed, timeout=5000):
+        controller.find_peaks()
+    assert np.array_equal(model.peaks, ecg_peaks(model.signal, model.sfreq,
+                                                 mindelay=.35))
+    peaks = model.peaks.copy()
+
+    # Changing a parameter re-detects the peaks within the visible part of
+    # the signal only. The intermediate stages of the detector are computed
+    # on the worker thread.
+    view.ax00.set_xlim(ecg_tuning["segment"])
+    window = np.rint(np.asarray(ecg_tuning["segment"]) *
+                     model.sfreq).astype(int)
+    assert model.tuner is None
+    with qtbot.waitSignal(model.peaks_changed, timeout=5000):
+        view.tuningboxes["ECG"]["gradthreshweight"].setValue(3)
+    assert isinstance(model.tuner, EcgTuner)
+    assert model.detectorparams["ECG"]["gradthreshweight"] == 3
+    outside = np.logical_or(peaks < window[0], peaks >= window[1])
+    inside = EcgTuner(model.signal, model.sfreq).peaks(gradthreshweight=3,
+                                                       mindelay=.35,
+                                                       window=window)
+    assert np.array_equal(model.peaks, np.union1d(peaks[outside], inside))
+    peaks = model.peaks.copy()
+
+    # While the worker thread tunes the detector, parameter changes don't
+    # re-detect the peaks. The most recent change is applied once the worker
+    # thread releases the lock.
+    with controller._tuninglock:
+        view.tuningboxes["ECG"]["minlenweight"].setValue(.3)
+        assert model.detectorparams["ECG"]["minlenweight"] == .3
+        assert np.array_equal(model.peaks, peaks)
+    with qtbot.waitSignal(model.peaks_changed, timeout=5000):
+        controller._apply_pending()
+    outside = np.logical_or(peaks < window[0], peaks >= window[1])
+    inside = EcgTuner(model.signal, model.sfreq).peaks(gradthreshweight=3,
+                                                       minlenweight=.3,
+                                                       mindelay=.35,
+                                                       window=window)
+    assert np.array_equal(model.peaks, np.union1d(peaks[outside], inside))
+
+    # Applying the parameters re-detects the peaks in the entire signal.
+    with qtbot.waitSignal(model.peaks_changed, timeout=5000):
+        controller.apply_tuning()
+    assert np.array_equal(model.peaks,
+                          ecg_peaks(model.signal, model.sfreq, mindelay=.35,
+                                    gradthreshweight=3, minlenweight=.3))
+    qtbot.waitUntil(view.tuningpanels["ECG"].isEnabled, timeout=5000)
+
+
 ecg_batch_os = {"modality": "ECG",
                 "sigchan": "A3",
                 "mode": "multiple files",
@@ -441,6 +520,7 @@ def test_batchfile(qtbot, tmpdir, cfg_batch):
         view.correctcheckbox.setCheckState(Qt.Checked)
     view.periodcheckbox.setCheckState(Qt.Checked)
     view.ratecheckbox.setCheckState(Qt.Checked)
+    view.usablecheckbox.setCheckState(Qt.Checked)
     model.fpaths = [datadir.joinpath(p) for p in cfg_batch["sigfnames"]]
     model.set_filetype(cfg_batch["filetype"])
 
@@ -470,11 +550,13 @@ def test_batchfile(qtbot, tmpdir, cfg_batch):
 
     # Load each peak file saved during batch processing and assess if
     # peaks have been identified correctly.
+    usables = []
     for sigfname, peaksum in zip(cfg_batch["sigfnames"],
                                  cfg_batch["peaksums"]):
         with qtbot.waitSignal(model.signal_changed, timeout=5000):
             model.fpaths = [datadir.joinpath(sigfname)]
             controller.read_channels()
+        usables.append(signal_quality(model.signal, model.sfreq))
         fname = Path(sigfname).stem
         model.rpathpeaks = tmpdir.join(f"{fname}_peaks.csv")
         with qtbot.waitSignal(model.peaks_changed, timeout=5000):
@@ -484,9 +566,11 @@ def test_batchfile(qtbot, tmpdir, cfg_batch):
 
     # Load each stats file saved during batch processing and assess if
     # stats have been caclualted correctly.
-    for sigfname, stat in zip(cfg_batch["sigfnames"], cfg_batch["stats"]):
+    for sigfname, stat, usable in zip(cfg_batch["sigfnames"],
+                                      cfg_batch["stats"], usables):
         fname = Path(sigfname).stem
         statsfname = tmpdir.join(f"{fname}_stats.csv")
         stats = pd.read_csv(statsfname)
         assert np.around(stats["period"].mean(), 4) == stat[0]
         assert np.around(stats["rate"].mean(), 4) == stat[1]
+        assert np.array_equal(stats["usable"], usable)
@@ -2,7 +2,21 @@
 
 import pytest
 import numpy as np
-from biopeaks.heart import _find_artifacts, _correct_artifacts, correct_peaks
+from pathlib import Path
+from scipy.signal import resample_poly, find_peaks
+from biopeaks import heart
+from biopeaks.heart import (_find_artifacts, _correct_artifacts, correct_peaks,
+                            ecg_peaks, ppg_peaks, heart_period, _window_peaks,
+                            _enforce_mindelay, _subspaces, _label_artifacts,
+                            _artifact_indices, EcgPeakDetector,
+                            PpgPeakDetector, ecg_peaks_parallel,
+                            ecg_peaks_sweep, ppg_peaks_sweep,
+                            EcgTuner, PpgTuner)
+from biopeaks.io_utils import read_opensignals, read_edf
+from biopeaks.analysis_utils import signal_quality
+
+
+datadir = Path(__file__).parent.resolve().joinpath("testdata")
 
 
 def compute_rmssd(peaks):
@@ -124,6 +138,177 @@ def test_extra_detection(peaks_extra, artifacts_extra):
     assert artifacts == artifacts_extra
 
 
+def subspaces_loop(drrs):
+    """Reference implementation of the subspaces s12 and s22."""
+    padding = 2
+    drrs_pad = np.pad(drrs, padding, "reflect")
+
+    s12 = np.zeros(drrs.size)
+    for d in np.arange(padding, padding + drrs.size):
+
+        if drrs_pad[d] > 0:
+            s12[d - padding] = np.max([drrs_pad[d - 1], drrs_pad[d + 1]])
+        elif drrs_pad[d] < 0:
+            s12[d - padding] = np.min([drrs_pad[d - 1], drrs_pad[d + 1]])
+
+    s22 = np.zeros(drrs.size)
+    for d in np.arange(padding, padding + drrs.size):
+
+        if drrs_pad[d] >= 0:
+            s22[d - padding] = np.min([drrs_pad[d + 1], drrs_pad[d + 2]])
+        elif drrs_pad[d] < 0:
+            s22[d - padding] = np.max([drrs_pad[d + 1], drrs_pad[d + 2]])
+
+    return s12, s22
+
+
+@pytest.mark.parametrize("size", [3, 4, 10, 1000])
+def test_subspaces(size):
+
+    rng = np.random.default_rng(size)
+    # Include zeros (and a NaN, e.g., from a zero threshold).
+    drrs = np.round(rng.normal(0, 2, size), 1)
+    drrs[::7] = 0
+    drrs[size // 2] = np.nan
+    s12, s22 = _subspaces(drrs)
+    s12_loop, s22_loop = subspaces_loop(drrs)
+
+    assert np.array_equal(s12, s12_loop, equal_nan=True)
+    assert np.array_equal(s22, s22_loop, equal_nan=True)
+
+
+def classify_loop(rr, drrs, mrrs, s12, s22, medrr, th2, c1, c2):
+    """Reference implementation of the artifact classification."""
+    extra_idcs = []
+    missed_idcs = []
+    ectopic_idcs = []
+    longshort_idcs = []
+
+    i = 0
+    while i < rr.size - 2:    # The flow control is implemented based on Figure 1
+
+        if np.abs(drrs[i]) <= 1:    # Figure 1
+            i += 1
+            continue
+        eq1 = np.logical_and(drrs[i] > 1, s12[i] < (-c1 * drrs[i] - c2))    # Figure 2a
+        eq2 = np.logical_and(drrs[i] < -1, s12[i] > (-c1 * drrs[i] + c2))    # Figure 2a
+
+        if np.any([eq1, eq2]):
+            # If any of the two equations is true.
+            ectopic_idcs.append(i)
+            i += 1
+            continue
+        # If none of the two equations is true.
+        if ~np.any([np.abs(drrs[i]) > 1, np.abs(mrrs[i]) > 3]):    # Figure 1
+            i += 1
+            continue
+        longshort_candidates = [i]
+        # Check if the following beat also needs to be evaluated.
+        if np.abs(drrs[i + 1]) < np.abs(drrs[i + 2]):
+            longshort_candidates.append(i + 1)
+
+        for j in longshort_candidates:
+            # Long beat.
+            eq3 = np.logical_and(drrs[j] > 1, s22[j] < -1)    # Figure 2b
+            # Long or short.
+            eq4 = np.abs(mrrs[j]) > 3    # Figure 1
+            # Short beat.
+            eq5 = np.logical_and(drrs[j] < -1, s22[j] > 1)    # Figure 2b
+
+            if ~np.any([eq3, eq4, eq5]):
+                # If none of the three equations is true: normal beat.
+                i += 1
+                continue
+            # If any of the three equations is true: check for missing or extra
+            # peaks.
+
+            # Missing.
+            eq6 = np.abs(rr[j] / 2 - medrr[j]) < th2[j]    # Figure 1
+            # Extra.
+            eq7 = np.abs(rr[j] + rr[j + 1] - medrr[j]) < th2[j]    # Figure 1
+
+            # Check if extra.
+            if np.all([eq5, eq7]):
+                extra_idcs.append(j)
+                i += 1
+                continue
+            # Check if missing.
+            if np.all([eq3, eq6]):
+                missed_idcs.append(j)
+                i += 1
+                continue
+            # If neither classified as extra or missing, classify as "long or
+            # short".
+            longshort_idcs.append(j)
+            i += 1
+
+    return {"ectopic": ectopic_idcs, "missed": missed_idcs,
+            "extra": extra_idcs, "longshort": longshort_idcs}
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 10, 1000])
+def test_classify_artifacts(seed, size):
+
+    # Random inputs with many beats exceeding the thresholds (including
+    # consecutive candidates for long or short beats) and a few NaNs.
+    rng = np.random.default_rng(seed)
+    rr = rng.uniform(.5, 1.5, size)
+    medrr = rng.uniform(.8, 1.2, size)
+    th2 = rng.uniform(.05, .5, size)
+    drrs, mrrs, s12, s22 = rng.normal(0, 2, (4, size))
+    if size > 3:
+        drrs[rng.integers(0, size, 2)] = np.nan
+        mrrs[rng.integers(0, size, 2)] = np.nan
+    c1, c2 = .13, .17
+
+    labels, _ = _label_artifacts(rr, drrs, mrrs, s12, s22, medrr, th2, c1,
+                                 c2)
+    artifacts = _artifact_indices(labels)
+
+    assert artifacts == classify_loop(rr, drrs, mrrs, s12, s22, medrr, th2, c1,
+                                      c2)
+
+
+def correct_loop(peaks, sfreq):
+    """Reference implementation of the iterative artifact correction, with
+    the artifacts found in all peaks at each iteration."""
+    artifacts = _find_artifacts(peaks, sfreq)
+    peaks_clean = _correct_artifacts(artifacts, peaks)
+    n_artifacts_previous = np.inf
+    n_artifacts_current = sum([len(i) for i in artifacts.values()])
+    previous_diff = 0
+    while n_artifacts_current - n_artifacts_previous != previous_diff:
+        previous_diff = n_artifacts_previous - n_artifacts_current
+        artifacts = _find_artifacts(peaks_clean, sfreq)
+        peaks_clean = _correct_artifacts(artifacts, peaks_clean)
+        n_artifacts_previous = n_artifacts_current
+        n_artifacts_current = sum([len(i) for i in artifacts.values()])
+
+    return peaks_clean
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_correction(seed):
+
+    # Peaks with misaligned, missed, and extra beats (including duplicate
+    # peaks), sparse or dense.
+    rng = np.random.default_rng(seed)
+    n = rng.integers(3, 3000)
+    rr = 1000 + 125 * rng.normal(np.sin(np.arange(n) / 5), .2)
+    peaks = np.cumsum(np.rint(rr)).astype(int)
+    n_misaligned = n // 4 if seed % 2 else max(n // 50, 1)
+    misaligned = rng.integers(0, n, n_misaligned)
+    peaks[misaligned] += rng.integers(-900, 900, n_misaligned)
+    peaks = np.delete(peaks, rng.integers(0, n, rng.integers(0, 5)))
+    extra = rng.integers(peaks.min(), peaks.max(), rng.integers(0, 5))
+    peaks = np.sort(np.concatenate((peaks, extra, peaks[:seed % 3])))
+
+    with np.errstate(all="ignore"):
+        assert np.array_equal(correct_peaks(peaks, 1000),
+                              correct_loop(peaks, 1000))
+
+
 @pytest.mark.parametrize("peaks_misaligned", [2, 4, 8],
                          indirect=["peaks_misaligned"])
 def test_misaligned_correction(peaks_misaligned, artifacts_misaligned):
@@ -235,6 +420,375 @@ def test_missed_correction_wrapper(peaks_correct, peaks_missed, iterative,
     assert int(rmssd_diff_uncorrected - rmssd_diff_corrected) == rmssd_diff
 
 
+@pytest.fixture
+def ecg_1000hz():
+    # Upsample the 100 Hz ECG test data to 1000 Hz.
+    data = read_opensignals(datadir.joinpath("OSmontage1J.txt"), "A3",
+                            "signal")
+    signal = resample_poly(data["signal"].astype(float), 10, 1)
+    return signal, 1000
+
+
+def test_ecg_decimation(ecg_1000hz):
+
+    signal, sfreq = ecg_1000hz
+    peaks = ecg_peaks(signal, sfreq)
+    peaks_decimated = ecg_peaks(signal, sfreq, workingfreq=250)
+
+    assert np.array_equal(peaks, peaks_decimated)
+
+
+def test_ecg_float32(ecg_1000hz):
+
+    signal, sfreq = ecg_1000hz
+    peaks = ecg_peaks(signal, sfreq)
+    peaks_float32 = ecg_peaks(signal.astype(np.float32), sfreq)
+    period, rate = heart_period(peaks_float32, sfreq, signal.size,
+                                dtype=np.float32)
+
+    assert np.array_equal(peaks, peaks_float32)
+    assert period.dtype == rate.dtype == np.float32
+
+
+def window_peaks_loop(signal, begs, ends, mindelay):
+    """Reference implementation of the peak search in ecg_peaks: one
+    find_peaks call per window."""
+    peaks = [0]
+    for beg, end in zip(begs, ends):
+        locmax, props = find_peaks(signal[beg:end], prominence=(None, None))
+        if locmax.size > 0:
+            peak = beg + locmax[np.argmax(props["prominences"])]
+            if peak - peaks[-1] > mindelay:
+                peaks.append(peak)
+    peaks.pop(0)
+
+    return np.asarray(peaks).astype(int)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int16])
+@pytest.mark.parametrize("mindelay", [0, 5, 50, 300])
+def test_window_peaks(dtype, mindelay):
+
+    # Coarsely quantized noise produces plateaus and ties in prominence.
+    rng = np.random.default_rng(42)
+    signal = np.rint(rng.normal(0, 2, 100000)).astype(dtype)
+    bounds = np.sort(rng.choice(signal.size, 4000, replace=False))
+    begs, ends = bounds[::2], bounds[1::2]
+
+    peaks = _enforce_mindelay(_window_peaks(signal, begs, ends, blocksize=1000),
+                              mindelay)
+
+    assert np.array_equal(peaks, window_peaks_loop(signal, begs, ends,
+                                                   mindelay))
+
+
+def test_window_peaks_ecg(ecg_1000hz):
+
+    # Windows around and in between the R-peaks.
+    signal, sfreq = ecg_1000hz
+    bounds = np.unique(ecg_peaks(signal, sfreq)[:, None] + [-50, 50])
+    begs, ends = bounds[:-1], bounds[1:]
+
+    peaks = _enforce_mindelay(_window_peaks(signal, begs, ends), 300)
+
+    assert np.array_equal(peaks, window_peaks_loop(signal, begs, ends, 300))
+
+
+@pytest.mark.parametrize("detector, filename, channel",
+                         [(ecg_peaks, "OSmontage1J.txt", "A3"),
+                          (ppg_peaks, "OSmontagePPG.txt", "A1")])
+def test_detector_loop(monkeypatch, detector, filename, channel):
+
+    data = read_opensignals(datadir.joinpath(filename), channel, "signal")
+    peaks = detector(data["signal"], data["sfreq"])
+
+    # Detect again with the reference loop instead of the batched search.
+    monkeypatch.setattr(heart, "_window_peaks",
+                        lambda signal, begs, ends: (signal, begs, ends))
+    monkeypatch.setattr(heart, "_enforce_mindelay",
+                        lambda windows, mindelay: window_peaks_loop(*windows,
+                                                                    mindelay))
+    peaks_loop = detector(data["signal"], data["sfreq"])
+
+    assert peaks.size > 0
+    assert np.array_equal(peaks, peaks_loop)
+
+
+def match_peaks(peaks, peaks_reference, tolerance):
+    """Fraction of the reference peaks that have a peak within tolerance
+    samples."""
+    idcs = np.clip(np.searchsorted(peaks, peaks_reference), 1, peaks.size - 1)
+    distance = np.minimum(np.abs(peaks[idcs] - peaks_reference),
+                          np.abs(peaks[idcs - 1] - peaks_reference))
+    return np.mean(distance <= tolerance)
+
+
+@pytest.mark.parametrize("filename", ["OSmontage1J.txt", "OSmontage2A.txt"])
+def test_ecg_detector(filename):
+
+    data = read_opensignals(datadir.joinpath(filename), "A3", "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+
+    # Pushing the signal in chunks of varying size (from single samples to
+    # more than the buffer) must give the same peaks as pushing it at once.
+    detector = EcgPeakDetector(sfreq)
+    peaks_whole = detector.push(signal)
+    detector.reset()
+    chunks = np.array_split(signal, [1, 2, 9, 100, 137, 1000, 1500, 20000])
+    peaks_chunked = np.concatenate([detector.push(chunk) for chunk in chunks])
+
+    assert np.array_equal(peaks_whole, peaks_chunked)
+
+    # Agreement with the batch detector.
+    peaks_batch = ecg_peaks(signal, sfreq)
+    assert match_peaks(peaks_whole, peaks_batch, 0) > .97
+    assert match_peaks(peaks_batch, peaks_whole, 0) > .97
+
+
+def test_ecg_detector_1000hz(ecg_1000hz):
+
+    signal, sfreq = ecg_1000hz
+    detector = EcgPeakDetector(sfreq)
+    peaks = np.concatenate([detector.push(chunk)
+                            for chunk in np.array_split(signal, 100)])
+    peaks_batch = ecg_peaks(signal, sfreq)
+
+    assert match_peaks(peaks, peaks_batch, 10) > .97
+    assert match_peaks(peaks_batch, peaks, 10) > .97
+
+
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+@pytest.mark.parametrize("chunklength", [5, 60])
+def test_ecg_parallel(ecg_1000hz, executor, chunklength):
+
+    signal, sfreq = ecg_1000hz
+    peaks = ecg_peaks(signal, sfreq)
+    peaks_parallel = ecg_peaks_parallel(signal, sfreq, chunklength=chunklength,
+                                        n_jobs=2, executor=executor)
+
+    # Away from the edges of the chunks, the R-peaks must be identical to the
+    # serial detection.
+    edges = np.arange(0, signal.size, chunklength * sfreq)
+    interior = np.min(np.abs(peaks[:, None] - edges), axis=1) > sfreq
+    interior_parallel = np.min(np.abs(peaks_parallel[:, None] - edges),
+                               axis=1) > sfreq
+
+    assert np.array_equal(peaks[interior], peaks_parallel[interior_parallel])
+    assert match_peaks(peaks_parallel, peaks, 0) > .99
+    assert match_peaks(peaks, peaks_parallel, 0) > .99
+
+
+def test_quality_gating():
+
+    data = read_opensignals(datadir.joinpath("OSmontage1J.txt"), "A3",
+                            "signal")
+    signal, sfreq = data["signal"].astype(float), data["sfreq"]
+    assert np.all(signal_quality(signal, sfreq))
+
+    # Simulate a flat line (electrode off) and a clipped stretch.
+    flat = slice(100 * sfreq, 130 * sfreq)
+    clipped = slice(160 * sfreq, 180 * sfreq)
+    signal[flat] = signal[flat.start]
+    signal[clipped] = np.where(np.arange(20 * sfreq) % 50 < 25, signal.max(),
+                               signal.min())
+    usable = signal_quality(signal, sfreq)
+    assert not np.any(usable[flat]) and not np.any(usable[clipped])
+    assert np.mean(usable) > .75
+
+    peaks = ecg_peaks(signal, sfreq, usable=usable)
+    assert np.all(usable[peaks])
+    assert np.array_equal(ecg_peaks(signal, sfreq,
+                                    usable=np.ones(signal.size, dtype=bool)),
+                          ecg_peaks(signal, sfreq))
+    assert np.array_equal(ecg_peaks_parallel(signal, sfreq, usable=usable,
+                                             chunklength=60), peaks)
+
+    # The correction must not fill the gaps with peaks.
+    assert not np.all(usable[correct_peaks(peaks, sfreq).astype(int)])
+    assert np.all(usable[correct_peaks(peaks, sfreq, usable=usable)])
+
+
+def test_quality_flat_duration():
+
+    data = read_opensignals(datadir.joinpath("OSmontage1J.txt"), "A3",
+                            "signal")
+    signal, sfreq = data["signal"].astype(float), data["sfreq"]
+
+    # Upsampling by repetition and coarse quantization repeat most samples
+    # without flat lines.
+    upsampled = np.repeat(signal, 8)
+    quantized = np.rint(signal / 20) * 20
+    assert np.mean(np.diff(upsampled) == 0) > .5
+    assert np.mean(np.diff(quantized) == 0) > .5
+    assert np.all(signal_quality(upsampled, 8 * sfreq))
+    assert np.all(signal_quality(quantized, sfreq))
+
+    # A flat line is unusable if it lasts longer than maxflatduration.
+    signal[100 * sfreq:int(100.4 * sfreq)] = signal[100 * sfreq]
+    assert np.all(signal_quality(signal, sfreq))
+    assert not np.all(signal_quality(signal, sfreq, maxflatduration=.3))
+
+    assert signal_quality(np.array([]), sfreq).size == 0
+
+
+@pytest.mark.parametrize("detector, filename, channel",
+                         [(ecg_peaks, "OSmontage1J.txt", "A3"),
+                          (ppg_peaks, "OSmontagePPG.txt", "A1")])
+def test_detection_details(detector, filename, channel):
+
+    data = read_opensignals(datadir.joinpath(filename), channel, "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+    usable = np.ones(signal.size, dtype=bool)
+    usable[50 * sfreq:60 * sfreq] = False
+
+    peaks, details = detector(signal, sfreq, mindelay=.6, usable=usable,
+                              return_details=True)
+
+    assert np.array_equal(peaks, detector(signal, sfreq, mindelay=.6,
+                                          usable=usable))
+    assert details["sfreq"] == sfreq
+    assert details["threshold"].size == signal.size
+    # Each candidate window that has not been rejected contributes exactly one
+    # peak.
+    windows = np.searchsorted(details["beg"], peaks, side="right") - 1
+    assert np.array_equal(windows, np.flatnonzero(details["rejected"] == ""))
+    assert np.all(peaks < details["end"][windows])
+    assert {"unusable", "short", "mindelay"} <= set(details["rejected"])
+    unusable = details["rejected"] == "unusable"
+    assert np.all(details["beg"][unusable] < 60 * sfreq)
+    assert np.all(details["end"][unusable] >= 50 * sfreq)
+
+
+@pytest.mark.parametrize("reader, filename, channel",
+                         [(read_opensignals, "OSmontagePPG.txt", "A1"),
+                          (read_edf, "EDFmontage0.edf", "A5")])
+def test_ppg_detector(reader, filename, channel):
+
+    data = reader(datadir.joinpath(filename), channel, "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+
+    detector = PpgPeakDetector(sfreq)
+    peaks_whole = detector.push(signal)
+    detector.reset()
+    chunks = np.array_split(signal, [1, 2, 9, 100, 137, 1000, 1500, 20000])
+    peaks_chunked = np.concatenate([detector.push(chunk) for chunk in chunks])
+
+    assert np.array_equal(peaks_whole, peaks_chunked)
+
+    peaks_batch = ppg_peaks(signal, sfreq)
+    assert match_peaks(peaks_whole, peaks_batch, 0) > .98
+    assert match_peaks(peaks_batch, peaks_whole, 0) > .98
+
+
+@pytest.mark.parametrize("peakwindow, beatwindow", [(.8, .5), (.3, .25)])
+def test_ppg_detector_long_peakwindow(peakwindow, beatwindow):
+
+    # If peakwindow exceeds beatwindow, the moving average over beatwindow is
+    # delayed instead.
+    data = read_opensignals(datadir.joinpath("OSmontagePPG.txt"), "A1",
+                            "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+
+    detector = PpgPeakDetector(sfreq, peakwindow=peakwindow,
+                               beatwindow=beatwindow)
+    peaks_whole = detector.push(signal)
+    detector.reset()
+    chunks = np.array_split(signal, [1, 2, 9, 100, 137, 1000, 20000])
+    peaks_chunked = np.concatenate([detector.push(chunk) for chunk in chunks])
+
+    assert np.array_equal(peaks_whole, peaks_chunked)
+    assert np.array_equal(peaks_whole, ppg_peaks(signal, sfreq,
+                                                 peakwindow=peakwindow,
+                                                 beatwindow=beatwindow))
+
+
+def test_ecg_sweep():
+
+    data = read_opensignals(datadir.joinpath("OSmontage1J.txt"), "A3",
+                            "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+    annotation = ecg_peaks(signal, sfreq)
+    grid = {"smoothwindow": [.05, .1], "avgwindow": [.5, .75],
+            "gradthreshweight": [1, 1.5], "minlenweight": [.2, .4],
+            "mindelay": [.2, .3]}
+
+    results = ecg_peaks_sweep(signal, sfreq, annotation=annotation, **grid)
+
+    assert len(results) == 32
+    for result in results:
+        params = {key: result[key] for key in grid}
+        assert np.array_equal(result["peaks"], ecg_peaks(signal, sfreq,
+                                                         **params))
+        if params == {"smoothwindow": .1, "avgwindow": .75,
+                      "gradthreshweight": 1.5, "minlenweight": .4,
+                      "mindelay": .3}:
+            assert result["sensitivity"] == result["precision"] == 1
+
+
+def test_ppg_sweep():
+
+    data = read_opensignals(datadir.joinpath("OSmontagePPG.txt"), "A1",
+                            "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+    grid = {"peakwindow": [.08, .111], "beatwindow": [.5, .667],
+            "beatoffset": [0, .02], "mindelay": [.2, .3]}
+
+    results = ppg_peaks_sweep(signal, sfreq, annotation=ppg_peaks(signal,
+                                                                  sfreq),
+                              **grid)
+
+    assert len(results) == 16
+    for result in results:
+        params = {key: result[key] for key in grid}
+        peaks = ppg_peaks(signal, sfreq, **params)
+        assert np.array_equal(result["peaks"], peaks)
+        assert 0 < result["sensitivity"] <= 1
+        assert 0 < result["precision"] <= 1
+
+
+@pytest.mark.parametrize("detector, tuner, filename, channel, steps",
+                         [(ecg_peaks, EcgTuner, "OSmontage1J.txt", "A3",
+                           [{}, {"gradthreshweight": 1.2},
+                            {"gradthreshweight": 1.2, "minlenweight": .2},
+                            {"avgwindow": .5}, {"smoothwindow": .05},
+                            {"mindelay": .25}, {}]),
+                          (ppg_peaks, PpgTuner, "OSmontagePPG.txt", "A1",
+                           [{}, {"beatoffset": .01},
+                            {"beatoffset": .01, "mindelay": .25},
+                            {"peakwindow": .08}, {"beatwindow": .5}, {}])])
+def test_tuner(detector, tuner, filename, channel, steps):
+
+    data = read_opensignals(datadir.joinpath(filename), channel, "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+    tuner = tuner(signal, sfreq)
+
+    # Change one parameter at a time (re-using the memoized stages).
+    for params in steps:
+        peaks = tuner.peaks(**params)
+        assert np.array_equal(peaks, detector(signal, sfreq, **params))
+
+        # Restricting detection to a range of samples only drops the peaks
+        # outside the range.
+        window = (peaks[10] - 5, peaks[50] + 5)
+        peaks_window = tuner.peaks(window=window, **params)
+        assert np.array_equal(peaks_window, peaks[10:51])
+
+
+@pytest.mark.parametrize("detector, tuner, filename, channel, params",
+                         [(ecg_peaks, EcgTuner, "OSmontage1J.txt", "A3",
+                           {"smoothwindow": .0004, "avgwindow": .0004}),
+                          (ppg_peaks, PpgTuner, "OSmontagePPG.txt", "A1",
+                           {"peakwindow": .001, "beatwindow": .001})])
+def test_short_windows(detector, tuner, filename, channel, params):
+
+    # Windows shorter than half a sample are widened to one sample.
+    data = read_opensignals(datadir.joinpath(filename), channel, "signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+
+    peaks = detector(signal, sfreq, **params)
+    assert np.array_equal(tuner(signal, sfreq).peaks(**params), peaks)
+
+
 ###############################################################################
 
 # import matplotlib.pyplot as plt
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import subprocess
+import sys
+
+
+# Generous upper bound of the import time in seconds, such that slow CI
+# machines pass. benchmarks/benchmark_import.py checks the tighter budget.
+IMPORT_BUDGET = 5
+
+
+@pytest.mark.parametrize("module", ["biopeaks.filters", "biopeaks.heart",
+                                    "biopeaks.resp", "biopeaks.io_utils",
+                                    "biopeaks.analysis_utils",
+                                    "biopeaks.multichannel"])
+def test_headless_import(module):
+
+    # Importing the core modules must not load GUI, plotting, or data frame
+    # libraries (they are imported where they are used).
+    probe = ("import sys; from timeit import default_timer as timer; "
+             f"start = timer(); import {module}; duration = timer() - start; "
+             "print(duration, "
+             "*sorted({name.split('.')[0] for name in sys.modules}))")
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True,
+                            text=True, check=True)
+    duration, *loaded = result.stdout.split()
+
+    assert not set(loaded) & {"matplotlib", "pandas", "PySide2"}
+    assert float(duration) < IMPORT_BUDGET
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+from pathlib import Path
+from biopeaks.multichannel import edf_peaks, peakfuncs
+from biopeaks.io_utils import read_edf, read_edf_channels, _read_edfchannel
+from biopeaks.analysis_utils import signal_quality
+
+
+datadir = Path(__file__).parent.resolve().joinpath("testdata")
+edfpath = datadir.joinpath("EDFmontage0.edf")
+
+
+def test_read_edf_channels():
+
+    data = read_edf_channels(edfpath)
+
+    assert len(data["signals"]) == 16
+    for channel in ["A1", "A5", "A16"]:
+        reference = read_edf(edfpath, channel, "signal")
+        assert np.array_equal(data["signals"][channel], reference["signal"])
+        assert data["sfreqs"][channel] == reference["sfreq"]
+
+    for channels in [[], ["A1", "A17"], ["A0"], ["A-1"], ["B1"]]:
+        assert read_edf_channels(edfpath, channels)["error"]
+
+
+def test_read_edf_truncated(tmp_path):
+
+    # Two channels with three and two samples per epoch. The incomplete last
+    # epoch ends in the first (signal[:12]) or second channel (signal[:14]).
+    signal = np.arange(14)
+    assert np.array_equal(_read_edfchannel(signal[:12], [3, 2], 1),
+                          [0, 1, 2, 5, 6, 7, 10, 11])
+    assert np.array_equal(_read_edfchannel(signal[:12], [3, 2], 2),
+                          [3, 4, 8, 9])
+    assert np.array_equal(_read_edfchannel(signal, [3, 2], 1),
+                          [0, 1, 2, 5, 6, 7, 10, 11, 12])
+    assert np.array_equal(_read_edfchannel(signal, [3, 2], 2),
+                          [3, 4, 8, 9, 13])
+
+    # A file whose last data record (2325 samples) is cut off after 150 of
+    # the 200 samples of the first channel keeps those 150 samples.
+    truncpath = tmp_path.joinpath("truncated.edf")
+    truncpath.write_bytes(edfpath.read_bytes()[:-(2325 - 150) * 2])
+    data = read_edf_channels(edfpath)
+    truncated = read_edf_channels(truncpath)
+    n_records = data["signals"]["A1"].size // 200
+    for channel, signal in data["signals"].items():
+        n_lost = 50 if channel == "A1" else signal.size // n_records
+        assert np.array_equal(truncated["signals"][channel],
+                              signal[:-n_lost])
+
+
+@pytest.mark.parametrize("executor", ["threads", "processes"])
+@pytest.mark.parametrize("dtype", [None, np.float32])
+def test_edf_peaks(executor, dtype):
+
+    modalities = {"A3": "ECG", "A5": "PPG", "A1": "RESP", "A12": "ECG"}
+    output = edf_peaks(edfpath, modalities, dtype=dtype, n_jobs=2,
+                       executor=executor)
+
+    assert not output["error"]
+    assert list(output["channels"]) == list(modalities)
+    # Each channel must give the same result as loading the channel on its
+    # own and running the detector.
+    for channel, modality in modalities.items():
+        data = read_edf(edfpath, channel, "signal")
+        signal = data["signal"]
+        if dtype is not None:
+            signal = signal.astype(dtype)
+        peaks = peakfuncs[modality](signal, data["sfreq"])
+        result = output["channels"][channel]
+        assert result["modality"] == modality
+        assert result["sfreq"] == data["sfreq"]
+        assert np.array_equal(result["peaks"], peaks)
+
+    assert edf_peaks(edfpath, {"A1": "EEG"})["error"]
+    assert edf_peaks(edfpath, {})["error"]
+    assert edf_peaks(edfpath, {"A17": "ECG"})["error"]
+
+
+def test_edf_peaks_quality():
+
+    modalities = {"A3": "ECG", "A5": "PPG", "A1": "RESP"}
+    output = edf_peaks(edfpath, modalities, quality=True)
+
+    for channel, modality in modalities.items():
+        data = read_edf(edfpath, channel, "signal")
+        result = output["channels"][channel]
+        usable = signal_quality(data["signal"], data["sfreq"])
+        assert np.array_equal(result["usable"], usable)
+        # The ECG and PPG detectors skip unusable parts of the signal (e.g.,
+        # the square wave in channel A3).
+        if modality != "RESP":
+            assert np.all(usable[result["peaks"]])
@@ -4,9 +4,11 @@ from PySide2.QtWidgets import (QWidget, QComboBox, QAction, QMainWindow,
                                QVBoxLayout, QHBoxLayout, QCheckBox,
                                QLabel, QStatusBar, QGroupBox, QDockWidget,
                                QLineEdit, QFormLayout, QPushButton,
-                               QProgressBar, QSplitter, QDialog)
+                               QProgressBar, QSplitter, QDialog,
+                               QDoubleSpinBox)
 from PySide2.QtCore import Qt, QSignalMapper, QRegExp
 from PySide2.QtGui import QIcon, QRegExpValidator
+from functools import partial
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import (FigureCanvasQTAgg as
                                                 FigureCanvas)
@@ -107,6 +109,8 @@ class View(QMainWindow):
         self.ratecheckbox.stateChanged.connect(lambda: self.select_stats("rate"))
         self.tidalampcheckbox = QCheckBox("tidal amplitude", self)
         self.tidalampcheckbox.stateChanged.connect(lambda: self.select_stats("tidalamp"))
+        self.usablecheckbox = QCheckBox("signal quality", self)
+        self.usablecheckbox.stateChanged.connect(lambda: self.select_stats("usable"))
 
         # channel selection
         self.sigchanmenulabel = QLabel("biosignal")
@@ -137,6 +141,32 @@ class View(QMainWindow):
         # initialize with default value
         self._model.set_markerchan(self.markerchanmenu.currentText())
 
+        # detector tuning; one panel per modality with a spinbox for each
+        # parameter of the detector, only the panel of the selected modality
+        # is visible; changing a parameter re-detects the peaks in the visible
+        # part of the signal
+        self.tuningpanels = {}
+        self.tuningboxes = {}
+        for modality, params in self._model.detectorparams.items():
+            tuninglayout = QFormLayout()
+            self.tuningboxes[modality] = {}
+            for name, value in params.items():
+                spinbox = QDoubleSpinBox(self)
+                spinbox.setDecimals(3)
+                spinbox.setSingleStep(.01)
+                # windows must be longer than zero seconds
+                spinbox.setRange(0 if name in ["beatoffset", "minlenweight",
+                                               "mindelay"] else .01, 10)
+                spinbox.setValue(value)
+                spinbox.valueChanged.connect(partial(self.tune_detector,
+                                                     modality, name))
+                tuninglayout.addRow(QLabel(name), spinbox)
+                self.tuningboxes[modality][name] = spinbox
+            self.tuningpanels[modality] = QWidget(self)
+            self.tuningpanels[modality].setLayout(tuninglayout)
+        self.applytuning = QPushButton("apply to entire signal")
+        self.applytuning.clicked.connect(self._controller.apply_tuning)
+
         # processing mode (batch or single file)
         self.batchmenulabel = QLabel("mode")
         self.batchmenu = QComboBox(self)
@@ -368,6 +398,7 @@ class View(QMainWindow):
         self.vlayoutB = QFormLayout()
         self.vlayoutC = QVBoxLayout()
         self.vlayoutD = QVBoxLayout()
+        self.vlayoutE = QVBoxLayout()
         self.hlayout0 = QHBoxLayout()
 
         self.optionsgroupA = QGroupBox("processing options")
@@ -386,15 +417,23 @@ class View(QMainWindow):
         self.vlayoutC.addWidget(self.correctcheckbox)
         self.optionsgroupC.setLayout(self.vlayoutC)
 
+        self.optionsgroupE = QGroupBox("detector")
+        for panel in self.tuningpanels.values():
+            self.vlayoutE.addWidget(panel)
+        self.vlayoutE.addWidget(self.applytuning)
+        self.optionsgroupE.setLayout(self.vlayoutE)
+
         self.optionsgroupD = QGroupBox("select statistics for saving")
         self.vlayoutD.addWidget(self.periodcheckbox)
         self.vlayoutD.addWidget(self.ratecheckbox)
         self.vlayoutD.addWidget(self.tidalampcheckbox)
+        self.vlayoutD.addWidget(self.usablecheckbox)
         self.optionsgroupD.setLayout(self.vlayoutD)
 
         self.vlayout1.addWidget(self.optionsgroupA)
         self.vlayout1.addWidget(self.optionsgroupB)
         self.vlayout1.addWidget(self.optionsgroupC)
+        self.vlayout1.addWidget(self.optionsgroupE)
         self.vlayout1.addWidget(self.optionsgroupD)
         self.optionsgroupwidget = QWidget()
         self.optionsgroupwidget.setLayout(self.vlayout1)
@@ -537,6 +576,10 @@ class View(QMainWindow):
     def display_progress(self, value):
         # if value is 0, the progressbar indicates a busy state
         self.progressBar.setRange(0, value)
+        # the detector can't be tuned while the worker thread is busy (e.g.,
+        # applying the tuning to the entire signal)
+        for panel in self.tuningpanels.values():
+            panel.setEnabled(value == 1)
 
 
     def toggle_segmenter(self, value):
@@ -639,16 +682,29 @@ class View(QMainWindow):
         self.canvas2.draw()
 
 
+    def tune_detector(self, modality, name, value):
+        """Update a parameter of the detector and re-detect the peaks in the
+        visible part of the signal."""
+        self._model.set_detectorparam([modality, name, value])
+        self._controller.tune_peaks(self.ax00.get_xlim())
+
+
     def toggle_options(self, event):
         if event in ["ECG", "PPG"]:
             self.tidalampcheckbox.setEnabled(False)
             self.tidalampcheckbox.setChecked(False)
             self.ax22.set_visible(False)
             self.canvas2.draw()
+            for modality, panel in self.tuningpanels.items():
+                panel.setVisible(modality == event)
+            self.applytuning.setEnabled(True)
         elif event == "RESP":
             self.tidalampcheckbox.setEnabled(True)
             self.ax22.set_visible(True)
             self.canvas2.draw()
+            for panel in self.tuningpanels.values():
+                panel.setVisible(False)
+            self.applytuning.setEnabled(False)
         elif event == "multiple files":
             self.editcheckbox.setEnabled(False)
             self.editcheckbox.setChecked(False)